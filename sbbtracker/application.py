@@ -2,50 +2,46 @@ import logging
 import multiprocessing
 import sys
 
-import matplotlib
+from sbbtracker.utils.startup_utils import StartupReport
 
-from sbbtracker.windows.constants import default_bg_color
-from sbbtracker.windows.main_windows import SBBTracker
+startup = StartupReport()
 
-matplotlib.use('Qt5Agg')
-import matplotlib.pyplot as plt
-
-import seaborn as sns
 from PySide6.QtCore import Qt
 from PySide6.QtGui import QPixmap
 from PySide6.QtWidgets import (
     QApplication,
     QMessageBox, QSplashScreen,
 )
-from qt_material import apply_stylesheet
 
-from sbbtracker import stats, settings, paths
+from sbbtracker import settings, paths
 from sbbtracker.utils import asset_utils
 
 logging.basicConfig(filename=paths.sbbtracker_folder.joinpath("sbbtracker.log"), filemode="w",
                     format='%(name)s - %(levelname)s - %(message)s', level=logging.WARNING)
 logging.getLogger().addHandler(logging.StreamHandler())
 
-DEBUG = False
-
-sns.set_style("darkgrid", {"axes.facecolor": default_bg_color})
+#  The main window needs numpy and pandas (through stats and graphs) for the match history and live graphs, so they
+#  can't wait until they're first used. Instead they're loaded once the splash screen is up, one at a time so the
+#  startup report shows what each of them costs. The simulator, record parser, requests and matplotlib are only
+#  imported when they're first used.
+deferred_imports = ["numpy", "pandas", "sbbtracker.stats", "sbbtracker.graphs", "sbbtracker.windows.main_windows"]
 
-plt.rcParams.update({'text.color': "white",
-                     'xtick.color': 'white',
-                     'ytick.color': 'white',
-                     'figure.facecolor': default_bg_color,
-                     'axes.labelcolor': "white"})
+DEBUG = False
 
 
 def main():
+    startup.checkpoint("Imports")
     multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     pixmap = QPixmap(asset_utils.get_asset("icon.png"))
     splash = QSplashScreen(pixmap)
     splash.show()
+    app.processEvents()
+    startup.checkpoint("Splash screen")
 
     app.setHighDpiScaleFactorRoundingPolicy(Qt.HighDpiScaleFactorRoundingPolicy.RoundPreferFloor)
-    apply_stylesheet(app, theme='dark_teal.xml')
+    qt_material = startup.import_module("qt_material")
+    qt_material.apply_stylesheet(app, theme='dark_teal.xml')
     stylesheet = app.styleSheet()
     stylesheet = stylesheet.replace("""QTabBar::tab {
       color: #ffffff;
@@ -54,8 +50,11 @@ def main():
       border: 0px;
     }""") + "QTabBar{ text-transform: none; }"
     app.setStyleSheet(stylesheet)
+    startup.checkpoint("Stylesheet")
 
-    stats.backup_stats()
+    modules = {name: startup.import_module(name) for name in deferred_imports}
+    modules["sbbtracker.stats"].start_backup()
+    startup.checkpoint("Backup")
 
     # TODO: uncomment this when the updater doesn't require input
 
@@ -95,10 +94,13 @@ For a full privacy policy, please visit sbbtracker.com/privacy.
 You may change your selection at any time at Settings > Data > Upload Matches""")
         settings.set_(settings.upload_data, reply == QMessageBox.Yes)
         settings.save()
+    startup.checkpoint("Prompts")
 
-    main_window = SBBTracker()
+    main_window = modules["sbbtracker.windows.main_windows"].SBBTracker()
     main_window.show()
     splash.finish(main_window)
+    startup.checkpoint("Main window")
+    startup.log()
     if settings.get(settings.show_patch_notes, False):
         main_window.show_patch_notes()
     sys.exit(app.exec())
@@ -0,0 +1,113 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+
+from sbbtracker.journal import Journal
+
+
+def card_key(character: dict):
+    """
+    @return: the (template id, golden) pair for a character on a board. Golden cards have their own template id,
+    one past the regular card's, so both are keyed by the regular card's id.
+    """
+    golden = bool(character.get("golden"))
+    try:
+        return int(character["id"]) - int(golden), golden
+    except (TypeError, ValueError):
+        return character["id"], golden
+
+
+class CardIndex:
+    """
+    An inverted index from the cards on the boards of the stored combats to the (match, round, player)
+    they were seen in, so matches can be looked up by their cards without reading back any combats.
+    Each match is kept as one record in a journal: the boards of its combats, reduced to their cards.
+    """
+    def __init__(self, path: Path):
+        self.lock = threading.RLock()
+        self.journal = Journal(path)
+        self.sessions = []  # match number -> session id
+        self.match_numbers = {}  # session id -> match number
+        self.players = []  # player number -> player id
+        self.player_numbers = {}  # player id -> player number
+        self.postings = defaultdict(list)  # (template id, golden) -> [(match number, round, player number)]
+        #  (template id, golden) -> the matches with the card on the player's own board, at any point or at the end
+        self.own_boards = defaultdict(set)
+        self.final_boards = defaultdict(set)
+        for record in self.journal.read():
+            self.index(record)
+
+    def __contains__(self, session_id: str):
+        return session_id in self.match_numbers
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def player_number(self, player_id: str):
+        if player_id not in self.player_numbers:
+            self.player_numbers[player_id] = len(self.players)
+            self.players.append(player_id)
+        return self.player_numbers[player_id]
+
+    def add(self, session_id: str, match_data: dict):
+        """
+        Index the boards of a match, unless it's already indexed
+        """
+        with self.lock:
+            if session_id in self.match_numbers:
+                return
+            boards = []
+            for combat in match_data.get("combat-info", []):
+                for player_id, board in combat.items():
+                    if isinstance(board, dict) and "characters" in board:
+                        boards.append([combat.get("round"), player_id,
+                                       [card_key(character) for character in board["characters"]]])
+            record = {"session-id": session_id, "player-id": match_data.get("player-id"), "boards": boards}
+            self.journal.append(record)
+            self.index(record)
+
+    def index(self, record: dict):
+        match_number = len(self.sessions)
+        self.sessions.append(record["session-id"])
+        self.match_numbers[record["session-id"]] = match_number
+        own_player = self.player_number(record["player-id"])
+        own_rounds = [combat_round for combat_round, player_id, _ in record["boards"]
+                      if player_id == record["player-id"] and combat_round is not None]
+        final_round = max(own_rounds, default=None)
+        for combat_round, player_id, cards in record["boards"]:
+            player_number = self.player_number(player_id)
+            for template_id, golden in cards:
+                key = (template_id, golden)
+                self.postings[key].append((match_number, combat_round, player_number))
+                if player_number == own_player:
+                    self.own_boards[key].add(match_number)
+                    if combat_round == final_round:
+                        self.final_boards[key].add(match_number)
+
+    @contextmanager
+    def batch(self):
+        with self.journal.batch():
+            yield self
+
+    def matches_with(self, cards: list, final_board=True):
+        """
+        @param cards: (template id, golden) pairs, with golden None for either
+        @param final_board: only count the player's board in their last combat, rather than any of their boards
+        @return: the session ids of the matches with all of the cards on the player's board, oldest first
+        """
+        boards = self.final_boards if final_board else self.own_boards
+        with self.lock:
+            matches = None
+            for template_id, golden in cards:
+                found = set()
+                for is_golden in ([False, True] if golden is None else [golden]):
+                    found |= boards.get((template_id, is_golden), set())
+                matches = found if matches is None else matches & found
+                if not matches:
+                    break
+            return [self.sessions[match_number] for match_number in sorted(matches or [])]
+
+    def close(self):
+        with self.lock:
+            self.journal.close()
@@ -1,18 +1,17 @@
 import json
-from collections import defaultdict
 
-import matplotlib
 import numpy as np
 import pandas as pd
 
 from sbbtracker.languages import tr
-
-matplotlib.use("Qt5Agg")
-from matplotlib import pyplot as plt
-from matplotlib.ticker import MaxNLocator
+from sbbtracker.windows.charts import LineSeries
+from sbbtracker.windows.constants import default_bg_color
 
 matches_per_hero = tr("Matches per Hero")
 mmr_change = tr("MMR Graph")
+#  matplotlib's default line colour, and its tab:red
+chart_line_color = "#1f77b4"
+chart_bar_color = "#d62728"
 color_palettes = {
     'paired':  ['#a6cee3', '#1f78b4', '#b2df8a', '#33a02c', '#fb9a99', '#e31a1c', '#fdbf6f', '#ff7f00'],
     'set':     ['#e41a1c', '#377eb8', '#4daf4a', '#984ea3', '#ff7f00', '#ffff33', '#a65628', '#f781bf'],
@@ -22,50 +21,123 @@ color_palettes = {
 
 
 class LivePlayerStates:
-    def __init__(self):
-        self.ids_to_health = defaultdict(dict)
-        self.ids_to_xp = defaultdict(dict)
-        self.ids_to_fractional_xp = defaultdict(dict)
-        self.ids_to_heroes = defaultdict(list)
-        self.ids_to_hero_ids = defaultdict(list)
+    """
+    The health and XP of each player in the current match, by round. They're kept in players x rounds arrays,
+    with a row per player in the order they were first seen, so the graphs can work on slices of them.
+    """
+    def __init__(self, players=8, rounds=32):
+        self.rows = {}  # player id -> row
+        self.player_ids = []  # row -> player id
+        self.healths = np.zeros((players, rounds), dtype=np.int32)
+        self.levels = np.zeros((players, rounds), dtype=np.int8)
+        self.experience = np.zeros((players, rounds), dtype=np.int8)
+        self.fractional_xps = np.zeros((players, rounds), dtype=np.float64)
+        #  the order the rounds were first updated in, for each player, or -1 for rounds they haven't been
+        self.sequence = np.full((players, rounds), -1, dtype=np.int64)
+        self.num_updates = np.zeros(players, dtype=np.int64)
+        self.hero_changes = []  # row -> [(update number, hero, hero id)], only when the hero changes
+        self.next_sequence = 0
+
+    def grow(self, players, rounds):
+        """
+        Make room for at least this many players and rounds
+        """
+        old_players, old_rounds = self.healths.shape
+        players = max(players, old_players)
+        rounds = max(rounds, old_rounds * 2 if rounds > old_rounds else old_rounds)
+        for name in ["healths", "levels", "experience", "fractional_xps", "sequence"]:
+            old = getattr(self, name)
+            new = np.full((players, rounds), -1 if name == "sequence" else 0, dtype=old.dtype)
+            new[:old_players, :old_rounds] = old
+            setattr(self, name, new)
+        num_updates = np.zeros(players, dtype=np.int64)
+        num_updates[:old_players] = self.num_updates
+        self.num_updates = num_updates
 
     def update_player(self, playerid, round_number, health, xp, hero, hero_id):
-        self.ids_to_health[playerid][round_number] = health
-        self.ids_to_xp[playerid][round_number] = xp
-        self.ids_to_fractional_xp[playerid][round_number] = float(f"{xp[0]}.{int(xp[2]) * 333333333}")
-        self.ids_to_heroes[playerid].append(hero)
-        self.ids_to_hero_ids[playerid].append(hero_id)
+        if playerid not in self.rows:
+            self.rows[playerid] = len(self.player_ids)
+            self.player_ids.append(playerid)
+            self.hero_changes.append([])
+        row = self.rows[playerid]
+        if row >= self.healths.shape[0] or round_number >= self.healths.shape[1]:
+            self.grow(row + 1, round_number + 1)
+        if self.sequence[row, round_number] < 0:
+            self.sequence[row, round_number] = self.next_sequence
+            self.next_sequence += 1
+        level, _, experience = xp.partition(".")
+        self.healths[row, round_number] = health
+        self.levels[row, round_number] = int(level)
+        self.experience[row, round_number] = int(experience)
+        self.fractional_xps[row, round_number] = float(f"{xp[0]}.{int(xp[2]) * 333333333}")
+        changes = self.hero_changes[row]
+        if not changes or changes[-1][2] != hero_id or changes[-1][1] != hero:
+            changes.append((int(self.num_updates[row]), hero, hero_id))
+        self.num_updates[row] += 1
 
     def get_ids(self):
-        return list(self.ids_to_heroes.keys())
+        return list(self.player_ids)
 
     def get_hero(self, player_id):
-        return self.ids_to_heroes[player_id][-1]
+        return self.hero_changes[self.rows[player_id]][-1][1]
+
+    def get_hero_ids(self, player_id):
+        """
+        @return: the player's hero id as of each update
+        """
+        row = self.rows[player_id]
+        changes = self.hero_changes[row]
+        ends = [update for update, _, _ in changes[1:]] + [int(self.num_updates[row])]
+        return [hero_id for (start, _, hero_id), end in zip(changes, ends) for _ in range(end - start)]
+
+    def get_rounds(self, player_id):
+        """
+        @return: the rounds the player has been updated in, in the order they were first updated
+        """
+        sequence = self.sequence[self.rows[player_id]]
+        rounds = np.flatnonzero(sequence >= 0)
+        return rounds[np.argsort(sequence[rounds], kind='stable')]
+
+    def last_rounds(self):
+        """
+        @return: the round each player was last first-updated in, a row per player
+        """
+        return self.sequence[:len(self.player_ids)].argmax(axis=1)
 
     def get_healths(self, player_id):
-        return self.ids_to_health[player_id]
+        rounds = self.get_rounds(player_id)
+        return dict(zip(rounds.tolist(), self.healths[self.rows[player_id], rounds].tolist()))
 
     def get_xps(self, player_id):
-        return self.ids_to_xp[player_id]
+        row = self.rows[player_id]
+        rounds = self.get_rounds(player_id)
+        return {round_number: f"{level}.{experience}" for round_number, level, experience
+                in zip(rounds.tolist(), self.levels[row, rounds].tolist(), self.experience[row, rounds].tolist())}
 
     def get_fractional_xps(self, player_id):
-        return self.ids_to_fractional_xp[player_id]
+        rounds = self.get_rounds(player_id)
+        return dict(zip(rounds.tolist(), self.fractional_xps[self.rows[player_id], rounds].tolist()))
 
     def clear(self):
-        self.ids_to_health.clear()
-        self.ids_to_xp.clear()
-        self.ids_to_fractional_xp.clear()
-        self.ids_to_heroes.clear()
-        self.ids_to_hero_ids.clear()
+        self.rows.clear()
+        self.player_ids.clear()
+        self.healths.fill(0)
+        self.levels.fill(0)
+        self.experience.fill(0)
+        self.fractional_xps.fill(0)
+        self.sequence.fill(-1)
+        self.num_updates.fill(0)
+        self.hero_changes.clear()
+        self.next_sequence = 0
 
     def json_friendly(self):
         players = [
             {
                 "player-id": player_id,
-                "heroes": self.ids_to_hero_ids[player_id],
-                "healths": self.ids_to_health[player_id],
-                "xps": self.ids_to_xp[player_id]
-            } for player_id in self.ids_to_heroes.keys()
+                "heroes": self.get_hero_ids(player_id),
+                "healths": self.get_healths(player_id),
+                "xps": self.get_xps(player_id)
+            } for player_id in self.player_ids
         ]
         return players
 
@@ -75,94 +147,146 @@ class LivePlayerStates:
 # live graphs
 
 
-def live_health_graph(states: LivePlayerStates, ax, palette):
-    players = states.get_ids()
-    last_values = [list(states.get_healths(player).values())[-1] for player in players]
+def live_lines(series: list, palette: str):
+    """
+    @param series: as returned by live_health_series or xp_series
+    @return: the LineSeries to chart, coloured from the palette in order
+    """
     colors = color_palettes[palette]
+    return [LineSeries(label, x, y, colors[index % len(colors)], opacity, annotation)
+            for index, (_, label, x, y, annotation, opacity) in enumerate(series)]
+
+
+def live_health_series(states: LivePlayerStates):
+    """
+    @return: (player id, hero, rounds, healths, annotation, opacity) for each player, highest health first
+    """
+    rows = np.arange(len(states.player_ids))
+    last_values = states.healths[rows, states.last_rounds()].astype(np.int64)
+
+    series = []
+    for row in np.argsort(last_values)[::-1]:
+        player = states.player_ids[row]
+        x = states.get_rounds(player)
+        y = states.healths[row, x]
+        series.append((player, states.get_hero(player), x, y, int(y[-1]), 1 if y[-1] > 0 else .2))
+    return series
+
+
+def xp_series(states: LivePlayerStates):
+    """
+    @return: (player id, hero, rounds, xps, annotation, opacity) for each player, highest XP first
+    """
+    rows = np.arange(len(states.player_ids))
+    last_rounds = states.last_rounds()
+    last_values = states.fractional_xps[rows, last_rounds]
+
+    series = []
+    for row in np.argsort(last_values)[::-1]:
+        player = states.player_ids[row]
+        x = states.get_rounds(player)[0:13]  # filtering only the fist 13 rounds because nothing beyond 6.0 matters
+        y = states.fractional_xps[row, x]
+        display_xp = float(f"{states.levels[row, last_rounds[row]]}.{states.experience[row, last_rounds[row]]}")
+        series.append((player, states.get_hero(player), x, y, display_xp, 1))
+    return series
 
-    idx = np.argsort(np.array(last_values))[::-1]
-    players = np.array(players)[idx]
-
-    for index, player in enumerate(players):
-        healths = states.get_healths(player)
-        x = list(healths.keys())
-        y = list(healths.values())
-
-        last_health = y[-1]
-        opacity = 1 if last_health > 0 else .2
-        ax.plot(x, y, label=states.get_hero(player), alpha=opacity, color=colors[index], linewidth=3.0)
-        ax.annotate(y[-1], (x[-1], y[-1]))
-    ax.legend(framealpha=1, labelcolor=colors)
-    ax.set_xlabel("Turn")
-    ax.set_ylabel("Health")
-    ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-    ax.yaxis.set_major_locator(MaxNLocator(integer=True))
 
-    return plt.gcf()
+# static graphs
 
 
-def xp_graph(states: LivePlayerStates, ax, palette):
-    players = states.get_ids()
-    last_values = [list(states.get_fractional_xps(player).values())[-1] for player in players]
-    colors = color_palettes[palette]
+def hero_freq(hero_counts: dict):
+    """
+    @return: the heroes that have been played, most played first, and how many matches they've been played in
+    """
+    # catches old data
+    hero_counts = {hero: count for hero, count in hero_counts.items() if not hero.isspace() and count > 0}
+    heroes = sorted(sorted(hero_counts), key=hero_counts.get, reverse=True)
+    return heroes, [hero_counts[hero] for hero in heroes]
 
-    idx = np.argsort(np.array(last_values))[::-1]
-    players = np.array(players)[idx]
-
-    for index, player in enumerate(players):
-        xps = states.get_fractional_xps(player)
-        display_xps = list(states.get_xps(player).values())
-        x = list(xps.keys())[0:13]  # filtering only the fist 13 rounds because nothing beyond 6.0 matters
-        y = list(xps.values())[0:13]
-
-        ax.plot(x, y, label=states.get_hero(player), color=colors[index], linewidth=3.0)
-        ax.annotate(float(display_xps[-1]), (x[-1], y[-1]))
-    ax.legend(framealpha=1, labelcolor=colors)
-    ax.set_xlabel("Turn")
-    ax.set_ylabel("XP")
-    ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-    ax.yaxis.set_major_locator(MaxNLocator(integer=True))
-    return plt.gcf()
 
-# static graphs
+def cumulative_mmr(mmr_changes: pd.Series, mmr_range):
+    """
+    @param mmr_range: how many of the last matches to include, or None for all of them
+    @return: the running total of the MMR changes over the last mmr_range matches
+    """
+    if mmr_range is not None:
+        mmr_changes = mmr_changes.tail(mmr_range)
+    return np.cumsum(mmr_changes.values.astype(int))
 
 
-def hero_freq_graph(df: pd.DataFrame, ax):
-    if len(df.index) > 0:
-        sorted_df = df.sort_values(by='StartingHero', ascending=True)
-        sorted_df = sorted_df[~sorted_df['StartingHero'].str.isspace()]
-        heroes = sorted_df["StartingHero"].unique()
-        matches = sorted_df.groupby("StartingHero").count()["Placement"].values
-        sort_by_wins = matches.argsort()[::-1]
-        heroes = heroes[sort_by_wins]
-        if len(matches) > 0:
-            # catches old data
-            ax.barh(heroes, matches[sort_by_wins], .8, color='tab:red')
-            ind = range(max(matches) + 1)
-            ax.invert_yaxis()
-            ax.grid(axis='y')
-            # ax.set_xticks(ind)
-            ax.set_title("Matches per Hero")
+def stats_chart(player_stats, graph_type: str, chart, mmr_range=25):
+    """
+    Draw one of the stats graphs on a ChartWidget
+    """
+    if graph_type == mmr_change:
+        data = player_stats.cumulative_mmr(mmr_range)
+        chart.set_lines([LineSeries("", np.arange(1, len(data) + 1), data, chart_line_color, 1, None)],
+                        legend=False, hlines=[(0, "white")])
+        chart.set_labels(tr("Cumulative MMR over last {0} games").format(len(data)), tr("Games"),
+                         tr("Cumulative MMR"))
+    elif graph_type == matches_per_hero:
+        heroes, matches = hero_freq(player_stats.hero_counts())
+        chart.set_bars(heroes, matches, chart_bar_color, horizontal=True)
+        chart.set_labels("Matches per Hero")
+
+
+#  matplotlib versions of the stats graphs, for exporting them as images. matplotlib is slow to import,
+#  so it's only imported the first time one of these is drawn.
+
+
+def pyplot():
+    import matplotlib
+    from matplotlib import pyplot as plt
+    if matplotlib.get_backend().lower() != "agg":
+        matplotlib.use("Agg")
+        plt.rcParams.update({'text.color': "white",
+                             'xtick.color': 'white',
+                             'ytick.color': 'white',
+                             'figure.facecolor': default_bg_color,
+                             'axes.facecolor': default_bg_color,
+                             'axes.grid': True,
+                             'axes.labelcolor': "white"})
+    return plt
+
+
+def hero_freq_graph(hero_counts: dict, ax):
+    plt = pyplot()
+    heroes, matches = hero_freq(hero_counts)
+    if heroes:
+        ax.barh(heroes, matches, .8, color='tab:red')
+        ax.invert_yaxis()
+        ax.grid(axis='y')
+        ax.set_title("Matches per Hero")
 
     return plt.gcf()
 
 
-def mmr_graph(df: pd.DataFrame, ax, mmr_range):
-    mmrs = df["+/-MMR"].tail(mmr_range).values.astype(int)
-    data = np.cumsum(mmrs)
+def mmr_graph(mmr_changes: pd.Series, ax, mmr_range):
+    plt = pyplot()
+    data = cumulative_mmr(mmr_changes, mmr_range)
     timeseries = range(1, len(data) + 1)
-    plt.axhline(y=0, color='w', linewidth=2.0)
+    ax.axhline(y=0, color='w', linewidth=2.0)
     ax.plot(timeseries, data, linewidth=3.0)
     ax.set_ylabel(tr("Cumulative MMR"))
     ax.set_xlabel(tr("Games"))
-    ax.set_title(tr("Cumulative MMR over last {0} games").format(mmr_range))
+    ax.set_title(tr("Cumulative MMR over last {0} games").format(len(data)))
     # ax.set_xticks(range(1, 21))
 
     return plt.gcf()
 
 
-def stats_graph(df: pd.DataFrame, graph_type: str, ax, mmr_range=25):
+def stats_graph(player_stats, graph_type: str, ax, mmr_range=25):
     if graph_type == mmr_change:
-        return mmr_graph(df, ax, mmr_range)
+        return mmr_graph(player_stats.query(group_by="match", metrics=["+/-MMR"])["+/-MMR"], ax, mmr_range)
     elif graph_type == matches_per_hero:
-        return hero_freq_graph(df, ax)
+        return hero_freq_graph(player_stats.hero_counts(), ax)
+
+
+def save_stats_graph(player_stats, graph_type: str, filepath, mmr_range=25):
+    """
+    Export one of the stats graphs as an image
+    """
+    plt = pyplot()
+    figure = plt.Figure(figsize=(13.5, 9))
+    stats_graph(player_stats, graph_type, figure.subplots(), mmr_range)
+    figure.savefig(filepath)
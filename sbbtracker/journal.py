@@ -0,0 +1,100 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+
+class Journal:
+    """
+    An append-only file of JSON records, one per line. Each record is fsync'd before append returns,
+    unless it's part of a batch, in which case the whole batch is fsync'd once at the end.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        self.repair()
+        self.file = open(self.path, "a", encoding="utf-8", newline="\n")
+
+    def repair(self):
+        """
+        Drop a record that was only partly written when the tracker crashed
+        """
+        if not self.path.exists():
+            return
+        with open(self.path, "rb+") as file:
+            contents = file.read()
+            if contents and not contents.endswith(b"\n"):
+                logging.warning("Dropping a partly written record from the journal")
+                file.truncate(contents.rfind(b"\n") + 1)
+
+    def read(self):
+        """
+        @return: every record in the journal, oldest first
+        """
+        records = []
+        with self.lock:
+            self.file.flush()
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    try:
+                        records.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        logging.exception("Skipping a corrupt journal record")
+        return records
+
+    def append(self, record: dict):
+        with self.lock:
+            self.file.write(json.dumps(record, separators=(',', ':')) + "\n")
+            if not self.batch_depth:
+                self.sync()
+
+    def sync(self):
+        with self.lock:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    @contextmanager
+    def batch(self):
+        with self.lock:
+            self.batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.batch_depth -= 1
+                if not self.batch_depth:
+                    self.sync()
+
+    def offset(self):
+        """
+        @return: the position just after the last record written so far
+        """
+        with self.lock:
+            self.file.flush()
+            return self.file.tell()
+
+    def truncate_before(self, offset: int):
+        """
+        Drop the records before offset (once they've been folded into a snapshot),
+        keeping anything appended since
+        """
+        with self.lock:
+            self.file.flush()
+            with open(self.path, "rb") as file:
+                file.seek(offset)
+                remaining = file.read()
+            temp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(temp_path, "wb") as temp_file:
+                temp_file.write(remaining)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            self.file.close()
+            os.replace(temp_path, self.path)
+            self.file = open(self.path, "a", encoding="utf-8", newline="\n")
+
+    def close(self):
+        with self.lock:
+            self.file.close()
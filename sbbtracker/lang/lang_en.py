@@ -77,6 +77,25 @@ lang = {
     "Export Stats": "",
     "Delete Stats": "",
     "Last backup date": "",
+    "Restore Stats": "",
+    "Replace your current stats with the backup from {0}?": "",
+    "Loading stats...": "",
+    "Merge Stats File": "",
+    "Merge progress": "",
+    "Couldn't read that stats file": "",
+    "Added {0} new matches": "",
+    "You haven't faced this player before": "",
+    "Faced {0} times, average place {1}": "",
+    "With {0}: {1} times, average place {2}": "",
+    "Faced {0} times": "",
+    "Stats": "",
+    "Couldn't load your stats. Check sbbtracker.log for details.": "",
+    "With {0}: {1} times": "",
+    "90% range: place {0}-{1}, top 4 {2}-{3}": "",
+    "90% range: {0}-{1}": "",
+    "Top 4 rate {0}, 90% range: {1}-{2}": "",
+    "Export Image": "",
+    "All": "",
     "Backup Stats": "",
     "Reimport Stats": "",
     "Reimporting is temporarily disabled": "",
@@ -0,0 +1,139 @@
+import json
+import logging
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+from sbbtracker.journal import Journal
+
+
+class MatchArchive:
+    """
+    An append-only archive of the per-match details that get uploaded at the end of a match.
+    Each match is packed as one zlib-compressed block for its summary plus one block per combat,
+    so a single combat can be read back without decoding the rest of the match.
+    The offsets of the blocks are kept in a journaled index keyed by session id.
+    """
+    def __init__(self, pack_path: Path, index_path: Path):
+        self.pack_path = pack_path
+        self.lock = threading.RLock()
+        self.batch_depth = 0
+        self.index_journal = Journal(index_path)
+        self.index = {}  # session id -> index entry
+        pack_size = pack_path.stat().st_size if pack_path.exists() else 0
+        for entry in self.index_journal.read():
+            blocks = [entry["summary"], *[combat[1:] for combat in entry["combats"]]]
+            if any(offset + length > pack_size for offset, length in blocks):
+                #  the tracker stopped before the match was fully written to the pack
+                logging.warning(f"Dropping {entry['session-id']} from the match archive, its data is incomplete")
+                continue
+            self.index[entry["session-id"]] = entry
+        self.pack = open(pack_path, "ab")
+
+    def __contains__(self, session_id: str):
+        return session_id in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def sessions(self):
+        return list(self.index.keys())
+
+    def write_block(self, value):
+        data = zlib.compress(json.dumps(value, separators=(',', ':')).encode("utf-8"))
+        offset = self.pack.tell()
+        self.pack.write(data)
+        return [offset, len(data)]
+
+    def read_block(self, offset: int, length: int):
+        with self.lock:
+            self.pack.flush()
+        with open(self.pack_path, "rb") as pack:
+            pack.seek(offset)
+            return json.loads(zlib.decompress(pack.read(length)))
+
+    def add(self, session_id: str, match_data: dict):
+        """
+        Pack a match, replacing any match already stored under the session id
+        """
+        with self.lock:
+            summary = {key: value for key, value in match_data.items() if key != "combat-info"}
+            entry = {
+                "session-id": session_id,
+                "summary": self.write_block(summary),
+                "combats": [[combat.get("round"), *self.write_block(combat)]
+                            for combat in match_data.get("combat-info", [])],
+            }
+            if not self.batch_depth:
+                self.sync()
+            self.index_journal.append(entry)
+            self.index[session_id] = entry
+
+    def sync(self):
+        with self.lock:
+            self.pack.flush()
+            os.fsync(self.pack.fileno())
+
+    @contextmanager
+    def batch(self):
+        """
+        Defer syncing to disk until the end of a bulk write
+        """
+        with self.lock:
+            self.batch_depth += 1
+        with self.index_journal.batch():
+            try:
+                yield self
+            finally:
+                #  the pack is synced before the index, so the index never points past what's on disk
+                with self.lock:
+                    self.batch_depth -= 1
+                    if not self.batch_depth:
+                        self.sync()
+
+    def get_match(self, session_id: str):
+        """
+        @return: the full match data, as it was added
+        """
+        entry = self.index[session_id]
+        match_data = self.read_block(*entry["summary"])
+        match_data["combat-info"] = [self.read_block(offset, length) for _, offset, length in entry["combats"]]
+        return match_data
+
+    def get_summary(self, session_id: str):
+        """
+        @return: the match data, without reading back its combats
+        """
+        return self.read_block(*self.index[session_id]["summary"])
+
+    def get_combat(self, session_id: str, round_number: int):
+        """
+        @return: the combat fought in the round, or None if there wasn't one
+        """
+        for combat_round, offset, length in self.index[session_id]["combats"]:
+            if combat_round == round_number:
+                return self.read_block(offset, length)
+        return None
+
+    def migrate(self, json_dir: Path):
+        """
+        Move the legacy one-file-per-match JSON files into the archive
+        """
+        migrated = []
+        with self.batch():
+            for match_file in json_dir.glob("*.json"):
+                try:
+                    with open(match_file, "r") as file:
+                        self.add(match_file.stem, json.load(file))
+                    migrated.append(match_file)
+                except Exception:
+                    logging.exception(f"Couldn't migrate {match_file}")
+        for match_file in migrated:
+            os.remove(match_file)
+
+    def close(self):
+        with self.lock:
+            self.pack.close()
+            self.index_journal.close()
@@ -0,0 +1,112 @@
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+from sbbtracker.journal import Journal
+from sbbtracker.utils import asset_utils
+
+
+#  bump this when the way placements are worked out changes, so the index is rebuilt from the match archive
+opponent_index_version = 2
+
+
+def final_placements(players: list):
+    """
+    Work out where the knocked out players finished from their health over the match. The later a player was knocked
+    out the better they placed, and players knocked out in the same round are ranked by their remaining health.
+    The places of players still alive when the match data ends aren't known (unless there's only one of them).
+    @param players: the players, as saved by LivePlayerStates.json_friendly
+    @return: player id -> placement, for the players whose placement is known
+    """
+    def finish(player):
+        healths = sorted((int(round_number), int(health)) for round_number, health in player["healths"].items())
+        knocked_out = next((round_number for round_number, health in healths if health <= 0), None)
+        return knocked_out, healths[-1][1] if healths else 0
+
+    knocked_out = sorted((player for player in players if finish(player)[0] is not None), key=finish, reverse=True)
+    survivors = [player for player in players if finish(player)[0] is None]
+    placements = {player["player-id"]: place for place, player in enumerate(knocked_out, start=len(survivors) + 1)}
+    if len(survivors) == 1:
+        placements[survivors[0]["player-id"]] = 1
+    return placements
+
+
+class OpponentIndex:
+    """
+    Everyone the player has been in a lobby with, keyed by their player id: how often, where they finished,
+    and with which heroes. Each match is kept as one record in a journal, and the totals are rebuilt from them at load.
+    Encounters where an opponent's placement isn't known count towards how often they've been faced, but not
+    towards their average placement.
+    """
+    def __init__(self, path: Path):
+        self.lock = threading.RLock()
+        self.journal = Journal(path)
+        self.sessions = set()
+        #  player id -> [matches, placed matches, summed placement, hero -> [matches, placed matches, summed placement]]
+        self.opponents = {}
+        records = self.journal.read()
+        if any(record.get("version") != opponent_index_version for record in records):
+            #  indexed the old way, so start over; the stats backfill reindexes the archived matches
+            self.journal.truncate_before(self.journal.offset())
+            records = []
+        for record in records:
+            self.index(record)
+
+    def __contains__(self, session_id: str):
+        return session_id in self.sessions
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def add(self, session_id: str, match_data: dict):
+        """
+        Record the opponents in a match, unless it's already been recorded
+        """
+        with self.lock:
+            if session_id in self.sessions:
+                return
+            players = match_data.get("players", [])
+            placements = final_placements(players)
+            opponents = [[player["player-id"],
+                          asset_utils.get_card_name(player["heroes"][-1]) if player["heroes"] else "",
+                          placements.get(player["player-id"])]
+                         for player in players if player["player-id"] != match_data.get("player-id")]
+            record = {"version": opponent_index_version, "session-id": session_id, "opponents": opponents}
+            self.journal.append(record)
+            self.index(record)
+
+    def index(self, record: dict):
+        self.sessions.add(record["session-id"])
+        for player_id, hero, place in record["opponents"]:
+            opponent = self.opponents.setdefault(player_id, [0, 0, 0, {}])
+            for totals in [opponent, opponent[3].setdefault(hero, [0, 0, 0])]:
+                totals[0] += 1
+                if place is not None:
+                    totals[1] += 1
+                    totals[2] += place
+
+    @contextmanager
+    def batch(self):
+        with self.journal.batch():
+            yield self
+
+    def lookup(self, player_id: str):
+        """
+        @return: the number of matches against the player, their average placement, and hero -> (matches, average
+        placement) for the heroes they played; or None if the player's never been faced. The average placements are
+        None if none of the player's placements are known.
+        """
+        def average(placed, placement):
+            return round(placement / placed, 2) if placed else None
+
+        with self.lock:
+            if player_id not in self.opponents:
+                return None
+            matches, placed, placement, heroes = self.opponents[player_id]
+            return matches, average(placed, placement), \
+                {hero: (hero_matches, average(hero_placed, hero_placement))
+                 for hero, (hero_matches, hero_placed, hero_placement) in heroes.items()}
+
+    def close(self):
+        with self.lock:
+            self.journal.close()
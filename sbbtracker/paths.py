@@ -14,6 +14,9 @@ else:
     sbbtracker_folder = old_sbbtracker_folder
 stats_format = ".csv"
 statsfile = sbbtracker_folder.joinpath("stats" + stats_format)
+aggregates_file = sbbtracker_folder.joinpath("aggregates.json")
+journal_file = sbbtracker_folder.joinpath("stats.journal")
+stats_cache_file = sbbtracker_folder.joinpath("stats.cache")
 backup_dir = Path(sbbtracker_folder).joinpath("backups")
 if not sbbtracker_folder.exists():
     if old_sbbtracker_folder.exists() and os_name == "Windows":
@@ -24,6 +27,10 @@ if not sbbtracker_folder.exists():
 
 if not backup_dir.exists():
     backup_dir.mkdir()
+backup_chunks_dir = backup_dir.joinpath("chunks")
+if not backup_chunks_dir.exists():
+    backup_chunks_dir.mkdir()
+backup_manifest = backup_dir.joinpath("manifest.json")
 
 offsetfile = sbbtracker_folder.joinpath("logfile.offset")
 if not offsetfile.exists():
@@ -32,6 +39,10 @@ if not offsetfile.exists():
 matches_dir = sbbtracker_folder.joinpath("matches")
 if not matches_dir.exists():
     matches_dir.mkdir()
+match_archive_file = sbbtracker_folder.joinpath("matches.pack")
+match_index_file = sbbtracker_folder.joinpath("matches.idx")
+card_index_file = sbbtracker_folder.joinpath("cards.idx")
+opponent_index_file = sbbtracker_folder.joinpath("opponents.idx")
 
 
 # Storybook Brawl paths
@@ -1,42 +1,68 @@
+import bisect
+import hashlib
+import io
 import json
 import logging
-import math
+import lzma
 import os.path
-import shutil
-from datetime import date, datetime
+import pickle
+import threading
+import time
+import warnings
+from collections import defaultdict
+from datetime import date, datetime, timedelta
 from pathlib import Path
 from tempfile import NamedTemporaryFile
 
 import numpy as np
 import pandas as pd
-from construct import GreedyRange
+from pandas.api.types import union_categoricals
 
 from sbbtracker.utils import asset_utils
 from sbbtracker.parsers import log_parser
 import sbbtracker.paths as paths
-from sbbtracker.parsers.record_parser import STRUCT_ACTION, id_to_action_name
-from sbbtracker.paths import backup_dir, statsfile, stats_format
+from sbbtracker.card_index import CardIndex
+from sbbtracker.journal import Journal
+from sbbtracker.match_archive import MatchArchive
+from sbbtracker.opponent_index import OpponentIndex
+from sbbtracker.paths import aggregates_file, backup_chunks_dir, backup_dir, backup_manifest, journal_file, \
+    stats_cache_file, statsfile
 
 
 headings = ["Hero", "# Matches", "Avg Place", "Top 4", "Wins", "Net MMR"]
-stats_per_page = 20
+#  number of new matches buffered before they're concatenated onto the frame
+append_block_size = 1000
+#  number of rows read at a time when merging in another stats file
+merge_chunk_size = 50000
+#  number of journaled matches (and deletions) that triggers folding the journal into the stats file
+compaction_threshold = 50
+#  how many days of daily backups are kept
+backup_retention_days = 180
+backup_lock = threading.Lock()
 
 pd.options.mode.chained_assignment = None
 
-stats_columns = ['StartingHero', 'EndingHero', 'Placement', 'Timestamp', '+/-MMR', 'SessionId']
-
-
-def sorting_key(sort_col: int):
-    """
-    @param sort_col: the column to sort
-    @return: the key function for sorting a column
-    """
-    if sort_col == 0:
-        return str
-    elif sort_col == 2:
-        return lambda x: float(x) if float(x) > 0 else float("inf")
-    else:
-        return float
+stats_columns = ['StartingHero', 'EndingHero', 'Placement', 'Timestamp', '+/-MMR', 'SessionId', 'BuildId']
+#  the hero categories are kept sorted, so sorting by a hero column is sorting by its codes
+stats_dtypes = {'StartingHero': 'category', 'EndingHero': 'category', 'Placement': 'int8',
+                'Timestamp': 'datetime64[ns]', '+/-MMR': 'int16', 'SessionId': 'string', 'BuildId': 'category'}
+hero_types = ['StartingHero', 'EndingHero']
+#  matches, summed placement, top 4s, wins, net MMR, then the number of matches finished in each place
+totals_columns = ['matches', 'placement', 'top4', 'wins', 'mmr', *[f"place{place}" for place in range(1, 9)]]
+#  the bounds of the bootstrapped confidence intervals for the average placement and the top 4 rate
+interval_metrics = ['avg_place_low', 'avg_place_high', 'top4_rate_low', 'top4_rate_high']
+#  what PlayerStats.query can compute for a hero (or all heroes): any of the totals, the average placement,
+#  the top 4 rate, and the confidence intervals for them
+hero_metrics = [*totals_columns, 'avg_place', 'top4_rate', *interval_metrics]
+#  the columns of the hero stats table, after the hero, and the intervals shown alongside them
+table_metrics = ['matches', 'avg_place', 'top4', 'wins', 'mmr', *interval_metrics]
+#  number of resamples drawn to bootstrap the confidence intervals
+bootstrap_resamples = 1000
+interval_confidence = 0.9
+#  bump this when the layout of the saved aggregates changes
+aggregates_version = 3
+#  bump this when the layout of the cached match history changes
+stats_cache_version = 3
 
 
 def adjust_legacy_df(df: pd.DataFrame):
@@ -48,13 +74,16 @@ def adjust_legacy_df(df: pd.DataFrame):
     if '+/-MMR' not in df.columns:
         #  Pre-MMR data gets 0 MMR for each game
         df["+/-MMR"] = "0"
+    if 'BuildId' not in df.columns:
+        #  Pre-build data gets no build
+        df["BuildId"] = ""
     if 'Hero' in df.columns:
         #  Legacy data
         df = df.rename({'Hero': "EndingHero"}, axis='columns')
         df["StartingHero"] = " "
         df = df[stats_columns]
     #  clean up empty timestamps into some old time (that I thought was unix epoch but was off by 3 years lol)
-    df['Timestamp'] = df['Timestamp'].replace(r'^\s*$', "1973-01-01", regex=True)
+    df['Timestamp'] = df['Timestamp'].mask(df['Timestamp'].astype(str).str.strip() == "", "1973-01-01")
     #  Grandmother IS Big Bad Wolf
     df['EndingHero'] = df['EndingHero'].replace('Big Bad Wolf', 'Grandmother')
     for hero_type in ['StartingHero', 'EndingHero']:
@@ -63,24 +92,587 @@ def adjust_legacy_df(df: pd.DataFrame):
     return df
 
 
+def typed_stats_df(df: pd.DataFrame):
+    """
+    Convert the match history to the stats_dtypes, dropping any weird stats that don't fit them
+    """
+    df = df[stats_columns].assign(**{
+        'BuildId': df['BuildId'].fillna(""),
+        'Placement': pd.to_numeric(df['Placement'], errors='coerce'),
+        '+/-MMR': pd.to_numeric(df['+/-MMR'], errors='coerce'),
+        'Timestamp': df['Timestamp'] if pd.api.types.is_datetime64_any_dtype(df['Timestamp'])
+        else pd.to_datetime(df['Timestamp'], format="%Y-%m-%d", errors='coerce'),
+    }).dropna()
+    return df.astype(stats_dtypes)
+
+
+def clean_stats_df(df: pd.DataFrame):
+    """
+    Bring a match history read from a csv up to date, drop any weird stats and sort it by time
+    """
+    return sort_by_time(typed_stats_df(adjust_legacy_df(df)))
+
+
+def new_stats_df():
+    return typed_stats_df(pd.DataFrame(columns=stats_columns))
+
+
+def concat_matches(df: pd.DataFrame, new_rows: pd.DataFrame):
+    """
+    Concatenate matches onto the match history, keeping its column types
+    """
+    new_rows = typed_stats_df(new_rows)
+    for column in [*hero_types, 'BuildId']:
+        categories = df[column].cat.categories
+        if not new_rows[column].cat.categories.isin(categories).all():
+            categories = categories.union(new_rows[column].cat.categories)
+            df[column] = df[column].cat.set_categories(categories)
+        new_rows[column] = new_rows[column].cat.set_categories(categories)
+    return pd.concat([df, new_rows], ignore_index=True)
+
+
+def sort_by_time(df: pd.DataFrame):
+    """
+    Stably sort the matches by their timestamps
+    """
+    if not df['Timestamp'].is_monotonic_increasing:
+        df = df.sort_values('Timestamp', kind='mergesort')
+    return df.reset_index(drop=True)
+
+
+def aggregate_heroes(df: pd.DataFrame, by=()):
+    """
+    Compute the per-hero totals for both hero types in a single groupby
+    @param df: match history, with the stats_dtypes
+    @param by: extra columns of df to group by ahead of the hero type and hero
+    @return: a frame indexed by (*by, hero type, hero) with the totals_columns
+    """
+    placements = df["Placement"].values.astype(np.int64)
+    long = pd.DataFrame({
+        **{column: tile_categorical(df[column].astype("category").values, len(hero_types)) for column in by},
+        "Role": pd.Categorical.from_codes(np.repeat(np.arange(len(hero_types)), len(df)), hero_types),
+        "Hero": union_categoricals([df[role].values for role in hero_types]),
+        "placement": np.tile(placements, len(hero_types)),
+        "top4": np.tile(placements <= 4, len(hero_types)),
+        "wins": np.tile(placements == 1, len(hero_types)),
+        "mmr": np.tile(df["+/-MMR"].values.astype(np.int64), len(hero_types)),
+        **{f"place{place}": np.tile(placements == place, len(hero_types)) for place in range(1, 9)},
+    })
+    grouped = long.groupby([*by, "Role", "Hero"], sort=False, observed=True)
+    aggregates = grouped.agg(matches=("placement", "size"),
+                             **{column: (column, "sum") for column in totals_columns[1:]})
+    return aggregates.astype(int)
+
+
+def tile_categorical(values: pd.Categorical, reps: int):
+    return pd.Categorical.from_codes(np.tile(values.codes, reps), values.categories)
+
+
+class HeroTable:
+    """
+    The rows of the hero stats table for one hero type, kept in hero order along with a sort key per column,
+    so the table can be re-sorted without regenerating the rows
+    """
+    def __init__(self, hero_rows: pd.DataFrame, overall: pd.DataFrame):
+        """
+        @param hero_rows: the table_metrics for each hero, as answered by PlayerStats.query
+        @param overall: the table_metrics over all the heroes
+        """
+        columns = [hero_rows[metric].tolist() for metric in table_metrics]
+        self.rows = [self.row(hero, values) for hero, values in zip(hero_rows.index, zip(*columns))]
+        self.overall = self.row("All Heroes", [overall[metric].iloc[0] for metric in table_metrics])
+        #  the top 4 rate and the confidence intervals of each row, shown alongside the table rather than in it
+        self.intervals = [self.row_intervals(values) for values in zip(*columns)]
+        self.overall_intervals = self.row_intervals([overall[metric].iloc[0] for metric in table_metrics])
+        matches = hero_rows['matches'].to_numpy()
+        self.keys = [
+            np.unique(np.array(hero_rows.index, dtype=str), return_inverse=True)[1],
+            matches,
+            #  heroes that haven't been played sort after the worst average
+            np.where(matches > 0, hero_rows['avg_place'].to_numpy(dtype=float), np.inf),
+            *[hero_rows[metric].to_numpy() for metric in ['top4', 'wins', 'mmr']],
+        ]
+
+    @staticmethod
+    def row(name, values):
+        matches, avg, top4, wins, net_mmr = values[:5]
+        return [name, str(matches), str(avg) if matches else "0", str(top4), str(wins), str(net_mmr)]
+
+    @staticmethod
+    def row_intervals(values):
+        """
+        @return: the top 4 rate and the interval_metrics, or None for a hero that hasn't been played
+        """
+        matches, _, top4 = values[:3]
+        if not matches:
+            return None
+        return (top4 / matches, *values[5:])
+
+    def order(self, sort_col: int, sort_asc: bool):
+        key = self.keys[sort_col]
+        #  matches the order of sorted(rows, reverse=sort_asc), ties staying in hero order either way
+        return np.argsort(-key if sort_asc else key, kind='stable')
+
+    def sorted(self, sort_col: int, sort_asc: bool):
+        """
+        @param sort_col: the column to sort
+        @param sort_asc: sort ascending
+        @return: the table rows, headed by the "All Heroes" row
+        """
+        return [self.overall, *[self.rows[i] for i in self.order(sort_col, sort_asc)]]
+
+    def sorted_intervals(self, sort_col: int, sort_asc: bool):
+        """
+        @return: the row_intervals of the rows, in the same order as sorted
+        """
+        return [self.overall_intervals, *[self.intervals[i] for i in self.order(sort_col, sort_asc)]]
+
+
+def bootstrap_intervals(histograms: np.ndarray, resamples=bootstrap_resamples, confidence=interval_confidence,
+                        seed=0):
+    """
+    Bootstrap confidence intervals for the average placement and the top 4 rate of every hero at once.
+    A hero's matches only differ by their placement, so resampling them is resampling the counts of their
+    placement histogram. This uses the Poisson bootstrap, where each match is drawn a Poisson(1) number of times,
+    so a place finished c times is drawn Poisson(c) times and every hero and place is resampled in a single draw.
+    @param histograms: the number of matches finished in each place, a row per hero
+    @return: a row per hero of the interval_metrics
+    """
+    histograms = np.asarray(histograms, dtype=np.int64).reshape(-1, 8)
+    counts = np.random.default_rng(seed).poisson(histograms, size=(resamples, *histograms.shape))
+    #  resamples that drew no matches at all say nothing about the hero, so they're left out
+    matches = np.where(counts.sum(axis=2) > 0, counts.sum(axis=2), np.nan)
+    avg_place = (counts @ np.arange(1, 9)) / matches
+    top4_rate = counts[:, :, :4].sum(axis=2) / matches
+    tails = [(1 - confidence) / 2, (1 + confidence) / 2]
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        intervals = np.concatenate([np.nanquantile(avg_place, tails, axis=0), np.nanquantile(top4_rate, tails, axis=0)])
+    #  heroes with no matches have no interval
+    return np.where(histograms.sum(axis=1) > 0, intervals, 0).T
+
+
+def empty_totals():
+    return [0] * len(totals_columns)
+
+
+def match_totals(placement, mmr_change, sign=1):
+    """
+    @return: the totals contributed by a single match (or taken away, with a negative sign)
+    """
+    placement = int(placement)
+    return [sign, sign * placement, sign * (placement <= 4), sign * (placement == 1), sign * int(mmr_change),
+            *[sign * (placement == place) for place in range(1, 9)]]
+
+
+def add_match_totals(bucket: dict, starting_hero: str, ending_hero: str, delta: list):
+    for role, hero in zip(hero_types, [starting_hero, ending_hero]):
+        totals = bucket[role].setdefault(hero, empty_totals())
+        for i, value in enumerate(delta):
+            totals[i] += value
+        if totals[0] == 0:
+            del bucket[role][hero]
+
+
+def week_start(day: str):
+    """
+    @return: the Monday starting the ISO week that the day is in
+    """
+    day = date.fromisoformat(day)
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+
+def shift_day(day: str, days: int):
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+class HeroAggregates:
+    """
+    Running per-hero totals for both hero types, rolled up by the day and by the ISO week the match was played,
+    and partitioned by the build of the game it was played on
+    """
+    def __init__(self):
+        self.buckets = {}  # day -> hero type -> hero -> totals
+        self.days = []  # sorted
+        self.week_buckets = {}  # monday -> hero type -> hero -> totals
+        self.weeks = []  # sorted
+        self.build_buckets = {}  # build id -> hero type -> hero -> totals
+        self.build_first_seen = {}  # build id -> the first day a match was played on it, in the order first seen
+        self.interval_cache = {}  # placement histogram -> interval_metrics
+
+    @classmethod
+    def from_df(cls, df: pd.DataFrame):
+        aggregates = cls()
+        if len(df.index) > 0:
+            days = df["Timestamp"].astype("category")
+            days = days.cat.rename_categories(days.cat.categories.strftime("%Y-%m-%d"))
+            grouped = aggregate_heroes(df.assign(Day=days.values), by=["Day"])
+            for (day, role, hero), row in zip(grouped.index, grouped.values.tolist()):
+                aggregates.bucket(day)[role][hero] = row
+            aggregates.rollup_weeks()
+            aggregates.add_builds(df)
+        return aggregates
+
+    def add_builds(self, df: pd.DataFrame):
+        """
+        Add a block of matches to the build partitions
+        """
+        df = df[(df["BuildId"] != "").to_numpy(dtype=bool)]
+        if len(df.index) == 0:
+            return
+        grouped = aggregate_heroes(df, by=["BuildId"])
+        first_seen = df.groupby("BuildId", sort=False, observed=True)["Timestamp"].min().dt.strftime("%Y-%m-%d")
+        for build in pd.unique(df["BuildId"].to_numpy()):
+            self.see_build(build, first_seen[build])
+        for (build, role, hero), row in zip(grouped.index, grouped.values.tolist()):
+            combine_bucket(self.build_buckets[build], {role: {hero: row}})
+
+    def see_build(self, build: str, day: str):
+        if build not in self.build_buckets:
+            self.build_buckets[build] = {role: {} for role in hero_types}
+        self.build_first_seen[build] = min(day, self.build_first_seen.get(build, day))
+
+    def builds(self):
+        """
+        @return: the builds, oldest first. Build ids don't sort, so they're ordered by when they were first seen.
+        """
+        return sorted(self.build_first_seen, key=self.build_first_seen.get)
+
+    @classmethod
+    def load(cls, source: Path):
+        """
+        @param source: the stats file these aggregates were saved with
+        @return: the saved aggregates, or None if they're missing or don't match the stats file
+        """
+        try:
+            with open(aggregates_file, "r") as file:
+                saved = json.load(file)
+            if saved.get("version") != aggregates_version or saved["source"] != file_signature(source):
+                return None
+            aggregates = cls()
+            for day, bucket in saved["aggregates"]["buckets"].items():
+                aggregates.bucket(day).update(bucket)
+            aggregates.rollup_weeks()
+            for build, first_seen, bucket in saved["aggregates"]["builds"]:
+                aggregates.build_buckets[build] = bucket
+                aggregates.build_first_seen[build] = first_seen
+            return aggregates
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logging.exception("Couldn't load the saved hero aggregates")
+            return None
+
+    def dumps(self):
+        """
+        @return: the serialized buckets, to be passed to save
+        """
+        builds = [[build, first_seen, self.build_buckets[build]] for build, first_seen in self.build_first_seen.items()]
+        return json.dumps({"buckets": self.buckets, "builds": builds}, separators=(',', ':'))
+
+    @staticmethod
+    def save(buckets: str, source: Path):
+        """
+        @param buckets: the buckets as returned by dumps
+        @param source: the stats file these aggregates were snapshotted with
+        """
+        replace_file(aggregates_file, lambda file: file.write(
+            f'{{"version":{aggregates_version},"source":{json.dumps(file_signature(source))},"aggregates":{buckets}}}'))
+
+    def bucket(self, day: str):
+        return get_bucket(self.buckets, self.days, day)
+
+    def merge(self, other: 'HeroAggregates'):
+        """
+        Add in the totals from other, e.g. the aggregates of a block of new matches
+        """
+        for day in other.days:
+            combine_bucket(self.bucket(day), other.buckets[day])
+        for week in other.weeks:
+            combine_bucket(self.week_bucket(week), other.week_buckets[week])
+        for build, first_seen in other.build_first_seen.items():
+            self.see_build(build, first_seen)
+            combine_bucket(self.build_buckets[build], other.build_buckets[build])
+
+    def week_bucket(self, day: str):
+        return get_bucket(self.week_buckets, self.weeks, week_start(day))
+
+    def rollup_weeks(self):
+        """
+        Rebuild the weekly rollups from the daily ones
+        """
+        self.week_buckets.clear()
+        self.weeks.clear()
+        for day in self.days:
+            combine_bucket(self.week_bucket(day), self.buckets[day])
+
+    def add(self, starting_hero: str, ending_hero: str, placement, mmr_change, day: str, build="", sign=1):
+        delta = match_totals(placement, mmr_change, sign)
+        buckets = [self.bucket(day), self.week_bucket(day)]
+        if build:
+            self.see_build(build, day)
+            buckets.append(self.build_buckets[build])
+        for bucket in buckets:
+            add_match_totals(bucket, starting_hero, ending_hero, delta)
+
+    def remove(self, starting_hero: str, ending_hero: str, placement, mmr_change, day: str, build=""):
+        self.add(starting_hero, ending_hero, placement, mmr_change, day, build, sign=-1)
+
+    def intervals(self, histograms: np.ndarray):
+        """
+        The bootstrapped confidence intervals for placement histograms. A hero's histogram only changes when they're
+        played, so the intervals are cached by histogram and only the new ones are bootstrapped, in one batch.
+        @return: a row per histogram of the interval_metrics
+        """
+        keys = [tuple(histogram) for histogram in np.asarray(histograms).tolist()]
+        missing = list(dict.fromkeys(key for key in keys if key not in self.interval_cache))
+        if missing:
+            for key, interval in zip(missing, bootstrap_intervals(np.array(missing)).tolist()):
+                self.interval_cache[key] = interval
+        return np.array([self.interval_cache[key] for key in keys], dtype=float).reshape(len(keys), 4)
+
+    def build_totals(self, build: str):
+        """
+        @return: hero type -> hero -> totals, for the matches played on the build
+        """
+        combined = {role: defaultdict(empty_totals) for role in hero_types}
+        combine_bucket(combined, self.build_buckets.get(build, {}))
+        return combined
+
+    def totals(self, start_date=None, end_date=None):
+        """
+        Combine the rollups in the (inclusive) date range: whole weeks from the weekly rollups,
+        and the partial weeks at either end from the daily ones
+        @return: hero type -> hero -> totals
+        """
+        combined = {role: defaultdict(empty_totals) for role in hero_types}
+        if not self.days:
+            return combined
+        start = self.days[0] if start_date is None else str(start_date)[:10]
+        end = self.days[-1] if end_date is None else str(end_date)[:10]
+        first_week = start if week_start(start) == start else shift_day(week_start(start), 7)
+        last_week = shift_day(week_start(shift_day(end, 1)), -7)
+        if first_week <= last_week:
+            combine_range(combined, self.week_buckets, self.weeks, first_week, last_week)
+            combine_range(combined, self.buckets, self.days, start, shift_day(first_week, -1))
+            combine_range(combined, self.buckets, self.days, shift_day(last_week, 7), end)
+        else:
+            combine_range(combined, self.buckets, self.days, start, end)
+        return combined
+
+
+def get_bucket(buckets: dict, keys: list, key: str):
+    if key not in buckets:
+        bisect.insort(keys, key)
+        buckets[key] = {role: {} for role in hero_types}
+    return buckets[key]
+
+
+def combine_bucket(combined: dict, bucket: dict):
+    for role, heroes in bucket.items():
+        role_totals = combined[role]
+        for hero, totals in heroes.items():
+            hero_totals = role_totals.setdefault(hero, empty_totals())
+            for i, value in enumerate(totals):
+                hero_totals[i] += value
+
+
+def combine_range(combined: dict, buckets: dict, keys: list, start: str, end: str):
+    for key in keys[bisect.bisect_left(keys, start):bisect.bisect_right(keys, end)]:
+        combine_bucket(combined, buckets[key])
+
+
+def replace_file(path: Path, write, binary=False):
+    """
+    Write a file by writing a temporary file beside it and swapping it in, so it's never left half written
+    @param write: called with the open temporary file
+    """
+    with NamedTemporaryFile(delete=False, dir=path.parent, mode='wb' if binary else 'w',
+                            **({} if binary else {'newline': ''})) as temp_file:
+        try:
+            write(temp_file)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+        except BaseException:
+            temp_file.close()
+            os.remove(temp_file.name)
+            raise
+    os.replace(temp_file.name, path)
+
+
+def file_signature(path: Path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_stats_cache(source: Path):
+    """
+    @param source: the stats file the cache has to match
+    @return: the cleaned match history, or None if the cache is missing or out of date
+    """
+    try:
+        with open(stats_cache_file, "rb") as file:
+            cached = pickle.load(file)
+        if cached["version"] == stats_cache_version and cached["pandas"] == pd.__version__ \
+                and cached["source"] == file_signature(source):
+            return cached["df"]
+    except FileNotFoundError:
+        pass
+    except Exception:
+        logging.exception("Couldn't load the stats cache")
+    return None
+
+
+def save_stats_cache(df: pd.DataFrame, source: Path):
+    """
+    @param df: the cleaned match history, as clean_stats_df would load it from source
+    @param source: the stats file df was saved to
+    """
+    try:
+        cached = {"version": stats_cache_version, "pandas": pd.__version__, "source": file_signature(source), "df": df}
+        replace_file(stats_cache_file, lambda file: pickle.dump(cached, file, protocol=pickle.HIGHEST_PROTOCOL),
+                     binary=True)
+    except Exception:
+        logging.exception("Couldn't save the stats cache")
+
+
+def load_stats_df():
+    """
+    Load the match history, skipping the csv parsing and cleanup if the cache is still in step with the stats file
+    """
+    if not statsfile.exists():
+        return new_stats_df()
+    df = load_stats_cache(statsfile)
+    if df is not None:
+        return df
+    try:
+        df = adjust_legacy_df(pd.read_csv(str(statsfile)))
+        if set(stats_columns).issubset(df.columns):
+            df = sort_by_time(typed_stats_df(df))
+            save_stats_cache(df, statsfile)
+            return df
+    except:
+        logging.exception("Error loading stats file. Attempting to load backup.")
+    try:
+        return clean_stats_df(read_backup())
+    except:
+        logging.exception("Couldn't load backup. Starting a new stats file")
+        return new_stats_df()
+
+
+def load_backup_manifest():
+    """
+    @return: the backup snapshots, oldest first
+    """
+    try:
+        with open(backup_manifest, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return []
+
+
+def save_backup_manifest(snapshots: list):
+    replace_file(backup_manifest, lambda file: json.dump(snapshots, file, indent=2))
+
+
+def write_chunk(data: bytes):
+    """
+    Compress and store a chunk of a backup under the hash of its contents, unless it's already stored
+    @return: the chunk's hash
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    chunk_file = backup_chunks_dir.joinpath(digest + ".xz")
+    if not chunk_file.exists():
+        with NamedTemporaryFile(delete=False, dir=backup_chunks_dir) as temp_file:
+            temp_file.write(lzma.compress(data, preset=1))
+            temp_name = temp_file.name
+        os.replace(temp_name, chunk_file)
+    return digest
+
+
+def read_chunk(digest: str):
+    return lzma.decompress(backup_chunks_dir.joinpath(digest + ".xz").read_bytes())
+
+
+def add_snapshot(snapshots: list, day: str, data: bytes, created: float):
+    """
+    Add (or replace) the snapshot for the day. If the stats file has only grown since the previous snapshot,
+    the snapshot reuses the previous one's chunks and only the new matches are stored.
+    """
+    snapshots[:] = [snapshot for snapshot in snapshots if snapshot["date"] != day]
+    earlier = [snapshot for snapshot in snapshots if snapshot["date"] < day]
+    previous = earlier[-1] if earlier else None
+    if previous and len(data) >= previous["size"] \
+            and hashlib.sha256(data[:previous["size"]]).hexdigest() == previous["digest"]:
+        chunks = previous["chunks"] + ([write_chunk(data[previous["size"]:])] if len(data) > previous["size"] else [])
+    else:
+        chunks = [write_chunk(data)]
+    snapshots.append({"date": day, "created": created, "size": len(data), "digest": hashlib.sha256(data).hexdigest(),
+                      "chunks": chunks})
+    snapshots.sort(key=lambda snapshot: snapshot["date"])
+
+
 def backup_stats(force=False):
-    daily_file = backup_dir.joinpath("backup_" + date.today().strftime("%Y-%m-%d") + stats_format)
-    if (not daily_file.exists() or force) and statsfile.exists():
-        # we haven't written the backup today lets do it (or we're forcing an overwrite)
-        backups = list(backup_dir.glob("backup*.csv"))
-        backups.sort(reverse=True)
-        shutil.copy(statsfile, daily_file)
-        if len(backups) > 7:
-            # we have reached the max number of backups, delete the oldest ones
-            for old_backup in backups[-(len(backups) - 7):]:
-                os.remove(old_backup)
+    with backup_lock:
+        snapshots = load_backup_manifest()
+        #  fold the old full-copy backups into the chain
+        legacy_backups = sorted(backup_dir.glob("backup_*.csv"))
+        for legacy_backup in legacy_backups:
+            add_snapshot(snapshots, legacy_backup.stem[len("backup_"):], legacy_backup.read_bytes(),
+                         os.path.getmtime(legacy_backup))
+        today = date.today().isoformat()
+        if (force or today not in [snapshot["date"] for snapshot in snapshots]) and statsfile.exists():
+            # we haven't written the backup today lets do it (or we're forcing an overwrite)
+            add_snapshot(snapshots, today, statsfile.read_bytes(), time.time())
+        cutoff = (date.today() - timedelta(days=backup_retention_days)).isoformat()
+        snapshots = [snapshot for snapshot in snapshots if snapshot["date"] >= cutoff] or snapshots[-1:]
+        save_backup_manifest(snapshots)
+        for legacy_backup in legacy_backups:
+            os.remove(legacy_backup)
+        referenced = {chunk for snapshot in snapshots for chunk in snapshot["chunks"]}
+        for chunk_file in backup_chunks_dir.glob("*.xz"):
+            if chunk_file.stem not in referenced:
+                os.remove(chunk_file)
+
+
+def start_backup(force=False, finished=None):
+    """
+    Back up the stats file on a background thread
+    @param finished: called (on the background thread) once the backup is written
+    """
+    def run():
+        try:
+            backup_stats(force)
+        except Exception:
+            logging.exception("Couldn't back up the stats")
+        if finished is not None:
+            finished()
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def backup_dates():
+    return [snapshot["date"] for snapshot in load_backup_manifest()]
+
+
+def read_backup(day: str = None):
+    """
+    @param day: the date to restore to, or None for the newest backup
+    @return: the match history from the newest snapshot taken on or before the day
+    """
+    snapshots = load_backup_manifest()
+    if day is not None:
+        snapshots = [snapshot for snapshot in snapshots if snapshot["date"] <= day]
+    if not snapshots:
+        raise FileNotFoundError(f"No backup taken on or before {day}")
+    data = b"".join(read_chunk(chunk) for chunk in snapshots[-1]["chunks"])
+    return pd.read_csv(io.BytesIO(data))
 
 
 def most_recent_backup_date():
-    backups = list(backup_dir.glob("backup*.csv"))
-    if backups:
-        sorted_by_recent = sorted(backups, key=os.path.getmtime, reverse=True)
-        timestamp = os.path.getmtime(sorted_by_recent[0])
+    snapshots = load_backup_manifest()
+    if snapshots:
+        timestamp = max(snapshot["created"] for snapshot in snapshots)
         return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
     else:
         return "Never"
@@ -90,157 +682,600 @@ class PlayerStats:
     """
     A class for loading, storing, and manipulating a player's match history and its relevant stats
     """
-    def __init__(self):
-        if os.path.exists(statsfile):
+    def __init__(self, load_history=True):
+        """
+        @param load_history: load the match history. Without it the stats start out empty, e.g. when the history
+        couldn't be loaded: new matches are still journaled, so the next full load picks them up, but the journal is
+        never folded into the stats file.
+        """
+        self.pending = []
+        self.history_orders = {}  # (sort column, ascending) -> display order
+        self.range_totals = {}  # (start date, end date) -> hero type -> hero -> totals
+        self.query_results = {}  # query arguments -> answer
+        #  running total of the MMR changes in the order the matches were played, after a leading 0,
+        #  with room to append to; None until it's first needed
+        self.mmr_totals = None
+        self.num_mmr_totals = 0
+        self.last_day = ""  # the latest day a match was played on
+        self.all_hero_counts = {}  # hero type -> hero -> matches over the whole history
+        self.lock = threading.RLock()
+        self.compaction_lock = threading.Lock()
+        self.closed = False
+        self.backfill_thread = None
+        self.history_loaded = load_history
+        self.df = load_stats_df() if load_history else new_stats_df()
+        self.session_ids = set(self.df['SessionId'].to_numpy())
+        self.aggregates = HeroAggregates.load(statsfile) if load_history and statsfile.exists() else None
+        if self.aggregates is None:
+            self.aggregates = HeroAggregates.from_df(self.df)
+            if load_history and statsfile.exists():
+                HeroAggregates.save(self.aggregates.dumps(), statsfile)
+        self.journal = Journal(journal_file)
+        self.journaled = 0
+        for record in self.journal.read() if load_history else []:
             try:
-                self.df = pd.read_csv(str(statsfile))
-                self.df = adjust_legacy_df(self.df)
-                if not set(stats_columns).issubset(self.df.columns):
-                    self.df = pd.read_csv(os.listdir(backup_dir)[0])
-                    self.df = adjust_legacy_df(self.df)
-            except:
-                logging.exception("Error loading stats file. Attempting to load backup.")
-                try:
-                    self.df = pd.read_csv(os.listdir(backup_dir)[0])
-                except:
-                    logging.exception("Couldn't load backup. Starting a new stats file")
-                    self.df = pd.DataFrame(columns=stats_columns)
-        else:
-            self.df = pd.DataFrame(columns=stats_columns)
-        self.df = self.df.dropna()  # cleanup any weird stats
+                if "Deleted" in record:
+                    self.remove_match(record["Deleted"])
+                elif not self.has_session(record["SessionId"]):
+                    self.add_match(record)
+            except Exception:
+                logging.exception(f"Skipping a bad journal record: {record}")
+            self.journaled += 1
+        if self.journaled:
+            self.start_compaction()
+        self.match_archive = MatchArchive(paths.match_archive_file, paths.match_index_file)
+        self.card_index = CardIndex(paths.card_index_file)
+        self.opponent_index = OpponentIndex(paths.opponent_index_file)
+        if load_history and (any(paths.matches_dir.glob("*.json")) or len(self.card_index) < len(self.match_archive)
+                             or len(self.opponent_index) < len(self.match_archive)):
+            self.backfill_thread = threading.Thread(target=self.backfill_match_info, daemon=True)
+            self.backfill_thread.start()
+
+    @property
+    def df(self):
+        """
+        The match history, including any matches that are still waiting in the append buffer
+        """
+        self.flush()
+        return self._df
+
+    @df.setter
+    def df(self, df: pd.DataFrame):
+        self._df = df
+
+    def flush(self):
+        """
+        Concatenate the buffered matches onto the match history in a single block, keeping it sorted by time
+        """
+        with self.lock:
+            if self.pending:
+                new_rows = pd.DataFrame(self.pending, columns=stats_columns)
+                self.pending = []
+                self.history_orders.clear()
+                self._df = sort_by_time(concat_matches(self._df, new_rows))
+
+    def time_slice(self, start_date, end_date):
+        """
+        @return: the contiguous block of matches played between start_date and end_date (inclusive, None for open)
+        """
+        df = self.df
+        timestamps = df['Timestamp'].values
+        start = 0 if start_date is None else timestamps.searchsorted(np.datetime64(str(start_date)), side='left')
+        end = len(timestamps) if end_date is None \
+            else timestamps.searchsorted(np.datetime64(str(end_date)), side='right')
+        return df.iloc[start:end]
+
+    def has_session(self, session_id: str):
+        return session_id in self.session_ids
 
     def export(self, filepath: Path):
         self.df.to_csv(filepath, index=False)
 
     def save(self):
-        backup_stats()
-        with NamedTemporaryFile(delete=False, mode='w', newline='') as temp_file:
-            self.df.to_csv(temp_file, index=False)
-            temp_name = temp_file.name
-        try:
-            with open(temp_name) as file:
-                df = pd.read_csv(file)
-            if set(stats_columns).issubset(df.columns):
-                shutil.move(temp_name, statsfile)
-        except:
-            logging.exception("Couldn't save settings correctly")
+        """
+        Fold the journal into the stats file. Only the matches journaled before the snapshot was taken
+        are dropped from the journal, so matches can keep being added while this runs.
+        """
+        with self.compaction_lock:
+            if self.closed or not self.history_loaded:
+                return
+            with self.lock:
+                df = self.df.copy()
+                buckets = self.aggregates.dumps()
+                journal_offset = self.journal.offset()
+                self.journaled = 0
+            backup_stats()
+            try:
+                saved_df = None
+
+                def write(file):
+                    nonlocal saved_df
+                    df.to_csv(file, index=False)
+                    file.flush()
+                    #  check the file reads back before it replaces the stats file
+                    saved_df = pd.read_csv(file.name)
+                    if not set(stats_columns).issubset(saved_df.columns):
+                        raise ValueError("The saved stats are missing columns")
+
+                with backup_lock:
+                    replace_file(statsfile, write)
+                HeroAggregates.save(buckets, statsfile)
+                save_stats_cache(clean_stats_df(saved_df), statsfile)
+                self.journal.truncate_before(journal_offset)
+            except:
+                logging.exception("Couldn't save settings correctly")
+
+    def start_compaction(self):
+        """
+        Fold the journal into the stats file on a background thread, unless that's already happening
+        """
+        if not self.compaction_lock.locked() and not self.closed and self.history_loaded:
+            threading.Thread(target=self.save, daemon=True).start()
+
+    def close(self):
+        #  wait for any compaction to finish, so the tracker can't exit with the stats file half written
+        with self.compaction_lock:
+            self.closed = True
+        #  and for the backfill to stop, so it isn't left writing to the archive and indexes as they're closed
+        if self.backfill_thread is not None:
+            self.backfill_thread.join()
+        self.journal.close()
+        self.match_archive.close()
+        self.card_index.close()
+        self.opponent_index.close()
+
+    def reset(self, df: pd.DataFrame):
+        """
+        Replace the whole match history
+        """
+        with self.lock:
+            self.pending = []
+            self.df = sort_by_time(typed_stats_df(df))
+            self.history_orders.clear()
+            self.range_totals.clear()
+            self.query_results.clear()
+            self.clear_series()
+            self.session_ids = set(self.df['SessionId'].to_numpy())
+            self.aggregates = HeroAggregates.from_df(self.df)
 
     def delete(self):
-        self.df = pd.DataFrame(columns=stats_columns)
+        self.reset(new_stats_df())
+        self.save()
 
-    def get_num_pages(self):
-        return math.ceil(len(self.df.index) / stats_per_page)
+    def restore(self, day: str):
+        """
+        Restore the match history to the newest backup taken on or before the day
+        """
+        self.reset(clean_stats_df(read_backup(day)))
+        self.save()
 
-    def get_page(self, page_num: int):
-        start_index = len(self.df.index) - stats_per_page * page_num
-        end_index = len(self.df.index) - stats_per_page * (page_num - 1)
-        adjusted_start = start_index if start_index > 0 else 0
-        match_stats = self.df[adjusted_start:end_index][::-1].loc[:, self.df.columns != 'Timestamp'].values.tolist()
-        padding = [["", "", "", "", ""] for _ in range(stats_per_page - len(match_stats))]
-        match_stats += padding
-        return match_stats
+    def history_order(self, sort_col: str = None, ascending=False):
+        """
+        @param sort_col: the column to sort by, or None for the order the matches were played in
+        @param ascending: sort ascending
+        @return: the positions of the matches in the order they should be displayed
+        """
+        df = self.df
+        key = (sort_col, ascending)
+        if key not in self.history_orders:
+            if sort_col is None:
+                order = np.arange(len(df.index))
+            else:
+                values = df[sort_col].values
+                if isinstance(values, pd.Categorical):
+                    values = values.codes
+                order = np.argsort(values, kind='stable')
+            self.history_orders[key] = order if ascending else order[::-1]
+        return self.history_orders[key]
 
     def update_stats(self, starting_hero: str, ending_hero: str, placement: str, mmr_change: str, session_id: str,
-                     timestamp: date = None):
-        if session_id not in self.df['SessionId'].values and starting_hero and ending_hero and placement \
+                     timestamp: date = None, build_id: str = ""):
+        if not self.has_session(session_id) and starting_hero and ending_hero and placement \
                 and mmr_change and session_id:
             if timestamp is None:
                 timestamp = datetime.now()
             if ending_hero == "Big Bad Wolf":
                 ending_hero = "Grandmother"
-            self.df = self.df.append(
-                {"StartingHero": starting_hero, "EndingHero": ending_hero, "Placement": placement,
-                 "Timestamp": timestamp.strftime("%Y-%m-%d"), "+/-MMR": str(mmr_change), "SessionId": session_id},
-                ignore_index=True)
+            match = {"StartingHero": starting_hero, "EndingHero": ending_hero, "Placement": placement,
+                     "Timestamp": timestamp.strftime("%Y-%m-%d"), "+/-MMR": str(mmr_change), "SessionId": session_id,
+                     "BuildId": build_id or ""}
+            with self.lock:
+                self.journal.append(match)
+                self.add_match(match)
+                self.journaled += 1
+            if self.journaled >= compaction_threshold and not self.journal.batch_depth:
+                self.start_compaction()
         else:
             logging.warning("Not adding existing match!")
 
-    def generate_stats(self, sort_col: int, sort_asc: bool, df=None):
-        if df is None:
+    def add_match(self, match: dict):
+        """
+        Add a match to the append buffer and the indexes
+        @param match: the match's stats_columns, with the Timestamp as a %Y-%m-%d string
+        """
+        with self.lock:
+            match = {"BuildId": "", **match}
+            self.pending.append({**match, "Timestamp": pd.Timestamp(match["Timestamp"])})
+            self.session_ids.add(match["SessionId"])
+            self.query_results.clear()
+            self.aggregates.add(match["StartingHero"], match["EndingHero"], match["Placement"], match["+/-MMR"],
+                                match["Timestamp"], match["BuildId"])
+            delta = match_totals(match["Placement"], match["+/-MMR"])
+            for (start, end), totals in self.range_totals.items():
+                if (start is None or start <= match["Timestamp"]) and (end is None or match["Timestamp"] <= end):
+                    add_match_totals(totals, match["StartingHero"], match["EndingHero"], delta)
+            for role, hero in zip(hero_types, [match["StartingHero"], match["EndingHero"]]):
+                if role in self.all_hero_counts:
+                    self.all_hero_counts[role][hero] = self.all_hero_counts[role].get(hero, 0) + 1
+            self.append_mmr(match["Timestamp"], int(match["+/-MMR"]))
+            if len(self.pending) >= append_block_size:
+                self.flush()
+
+    def add_matches(self, matches: pd.DataFrame):
+        """
+        Add a block of matches to the match history and the indexes in one go
+        @param matches: the matches, with the stats_dtypes
+        """
+        if matches.empty:
+            return
+        added = HeroAggregates.from_df(matches)
+        with self.lock:
+            self.flush()
+            self._df = sort_by_time(concat_matches(self._df, matches))
+            self.history_orders.clear()
+            self.query_results.clear()
+            self.clear_series()
+            self.session_ids.update(matches['SessionId'].to_numpy())
+            self.aggregates.merge(added)
+            for (start, end), totals in self.range_totals.items():
+                combine_bucket(totals, added.totals(start, end))
+
+    def merge_csv(self, filepath: Path, progress_handler=None):
+        """
+        Merge the matches from another stats file (e.g. one exported on another machine) into the match history.
+        The file is read merge_chunk_size rows at a time and only the matches that aren't already in the history
+        are added. Matches from before session ids were recorded are added unless an identical one already is.
+        @return: the number of matches added
+        """
+        total_size = os.path.getsize(filepath)
+        num_added = 0
+        with self.lock:
             df = self.df
-        df["Placement"] = pd.to_numeric(df["Placement"])
-        df["+/-MMR"] = pd.to_numeric(df["+/-MMR"])
-        stats = []
-        for hero_type in ["StartingHero", "EndingHero"]:
-            data = []
-            for value in asset_utils.content_id_lookup.values():
-                hero = value['Name']
-                heroid = value['Id']
-                if heroid.startswith("SBB_HERO") and hero != "Big Bad Wolf":
-                    bool_df = df[hero_type] == hero
-                    total_matches = sum(bool_df)
-                    avg = round(df.loc[bool_df, 'Placement'].mean(), 2)
-                    if math.isnan(avg):
-                        avg = 0
-                    total_top4 = len(df.loc[bool_df & (df['Placement'] <= 4), 'Placement'])
-                    total_wins = len(df.loc[bool_df & (df['Placement'] == 1), 'Placement'])
-                    net_mmr = df.loc[bool_df, '+/-MMR'].sum()
-                    data.append([hero, str(total_matches), str(avg), str(total_top4), str(total_wins), str(net_mmr)])
-
-            padding = [["", "", "", "", "", ""] for _ in range(asset_utils.get_num_heroes() - len(data))]
-            data = data + padding
-            global_matches = len(df)
-            global_avg = round(df["Placement"].mean(), 2)
-            if math.isnan(global_avg):
-                global_avg = 0
-            global_top4 = len(df.loc[df['Placement'] <= 4, 'Placement'])
-            global_wins = len(df.loc[df['Placement'] == 1, 'Placement'])
-            global_net_mmr = df["+/-MMR"].sum()
-
-            sorter = sorting_key(sort_col)
-            data = sorted(data, key=lambda x: sorter(x[sort_col]), reverse=sort_asc)
-            data.insert(0, ["All Heroes", str(global_matches), str(global_avg), str(global_top4), str(global_wins),
-                            str(global_net_mmr)])
-            stats.append(data)
-        return stats
-
-    def filter(self, start_date, end_date, sort_col: int, sort_asc: bool):
-        df = self.df
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'], format="%Y-%m-%d")
-        if str(start_date) <= "1973-01-01":
-            return self.generate_stats(sort_col, sort_asc)
+            no_session = df[df['SessionId'].str.strip() == ""]
+            old_matches = set(zip(*[no_session[column] for column in stats_columns[:5]]))
+        with open(filepath, "rb") as file:
+            for chunk in pd.read_csv(file, chunksize=merge_chunk_size):
+                chunk = adjust_legacy_df(chunk)
+                if not set(stats_columns).issubset(chunk.columns):
+                    raise ValueError(f"{filepath} isn't a stats file")
+                chunk = typed_stats_df(chunk)
+                has_session = (chunk['SessionId'].str.strip() != "").to_numpy(dtype=bool)
+                with self.lock:
+                    is_new = np.array([session_id not in self.session_ids
+                                       for session_id in chunk['SessionId'].to_numpy()], dtype=bool)
+                    new_matches = chunk[has_session & is_new].drop_duplicates('SessionId')
+                    old = chunk[~has_session]
+                    old = old[[match not in old_matches
+                               for match in zip(*[old[column] for column in stats_columns[:5]])]]
+                    new_matches = pd.concat([new_matches, old]) if len(old.index) else new_matches
+                    self.add_matches(new_matches)
+                num_added += len(new_matches.index)
+                if progress_handler:
+                    progress_handler(file.tell(), total_size)
+        if num_added:
+            #  merged matches aren't journaled, so they go straight into the stats file
+            self.save()
+        if progress_handler:
+            progress_handler(total_size, total_size)
+        return num_added
+
+    def query(self, date_range=(None, None), heroes=None, role="StartingHero", group_by="hero",
+              metrics=("matches",), build=None):
+        """
+        Answer a question about the match history. Answers are memoized until a match is added or deleted,
+        so the same question asked from several places is only worked out once. Treat them as read-only.
+        @param date_range: the (inclusive) start and end dates, either of which can be None for an open range
+        @param heroes: the heroes to include, or None for every hero that's been played
+        @param role: which hero of each match to go by, StartingHero or EndingHero
+        @param group_by: "hero" for a row per hero, None for a single row over all the heroes,
+        or "match" for a row per match, in the order they were played
+        @param metrics: hero_metrics when grouping by hero (or not at all), stats_columns when grouping by match
+        @param build: only include the matches played on this build of the game, or None for any build
+        @return: a frame with a column for each metric
+        """
+        start, end = [None if day is None else str(day)[:10] for day in date_range]
+        key = (start, end, None if heroes is None else tuple(heroes), role, group_by, tuple(metrics), build)
+        with self.lock:
+            if key not in self.query_results:
+                if group_by == "match":
+                    self.query_results[key] = self.query_matches(start, end, heroes, role, metrics, build)
+                else:
+                    self.query_results[key] = self.query_totals(start, end, heroes, role, group_by, metrics, build)
+            return self.query_results[key]
+
+    def query_totals(self, start, end, heroes, role, group_by, metrics, build=None):
+        if build is None:
+            totals = self.range_totals_for(start, end)
+        elif start is None and end is None:
+            #  the whole of a build is its partition's totals
+            totals = self.aggregates.build_totals(build)
         else:
-            filtered = df[(df['Timestamp'] >= start_date) & (df['Timestamp'] <= end_date)]
-            return self.generate_stats(sort_col, sort_asc, filtered)
+            grouped = aggregate_heroes(self.query_matches(start, end, None, role, stats_columns, build))
+            totals = {hero_type: {} for hero_type in hero_types}
+            for (hero_type, hero), row in zip(grouped.index, grouped.values.tolist()):
+                totals[hero_type][hero] = row
+        totals = totals[role]
+        names = list(totals.keys()) if heroes is None else list(heroes)
+        values = np.array([totals.get(hero, empty_totals()) for hero in names], dtype=np.int64)
+        values = values.reshape(len(names), len(totals_columns))
+        if group_by is None:
+            names = ["All Heroes"]
+            values = values.sum(axis=0, keepdims=True)
+        answer = pd.DataFrame(values, index=names, columns=totals_columns)
+        matches = answer['matches'].values
+        answer['avg_place'] = np.round(answer['placement'].values / np.maximum(matches, 1), 2)
+        answer['top4_rate'] = answer['top4'].values / np.maximum(matches, 1)
+        if not set(interval_metrics).isdisjoint(metrics):
+            answer[interval_metrics] = self.aggregates.intervals(values[:, 5:])
+        return answer[list(metrics)]
 
+    def query_matches(self, start, end, heroes, role, metrics, build=None):
+        df = self.time_slice(start, end)
+        if build is not None:
+            df = df[(df['BuildId'] == build).to_numpy(dtype=bool)]
+        if heroes is not None:
+            df = df[df[role].isin(heroes)]
+        return df[list(metrics)]
 
-    def get_stats_for_hero(self, start_date, end_date, hero_name):
-        df = self.df
-        df['Timestamp'] = pd.to_datetime(df['Timestamp'], format="%Y-%m-%d")
-        df = df[(df['Timestamp'] >= start_date) & (df['Timestamp'] <= end_date)]
-        hero_df = df.loc[df['StartingHero'] == hero_name]
-        avg_place = round(hero_df['Placement'].mean(), 2)
-        avg_place = 0.00 if np.isnan(avg_place) else avg_place
-        num_matches = len(hero_df)
-        histogram = np.histogram(hero_df['Placement'], bins=range(1, 10))
-        return avg_place, num_matches, histogram
+    def filter(self, start_date, end_date, sort_col: int, sort_asc: bool, build=None):
+        """
+        @param build: only include the matches played on this build of the game, or None for any build
+        @return: the hero stats table rows for each hero type
+        """
+        return [table.sorted(sort_col, sort_asc) for table in self.hero_tables(start_date, end_date, build)]
+
+    def hero_tables(self, start_date, end_date, build=None):
+        """
+        @param build: only include the matches played on this build of the game, or None for any build
+        @return: the unsorted HeroTable for each hero type
+        """
+        date_range = (None, None) if start_date is None or str(start_date) <= "1973-01-01" else (start_date, end_date)
+        return [HeroTable(self.query(date_range, asset_utils.hero_names, role, "hero", table_metrics, build),
+                          self.query(date_range, None, role, None, table_metrics, build))
+                for role in hero_types]
+
+    def builds(self):
+        """
+        @return: the builds of the game that matches have been played on, oldest first
+        """
+        with self.lock:
+            return self.aggregates.builds()
+
+    def range_totals_for(self, start_date, end_date):
+        """
+        The per-hero totals for a date range. They're kept current as matches are added, so asking for the
+        same range again (e.g. for the hero selection) is a dictionary lookup.
+        @param start_date: the first day, or None for an open range, and likewise end_date
+        @return: hero type -> hero -> totals
+        """
+        key = tuple(None if day is None else str(day)[:10] for day in (start_date, end_date))
+        with self.lock:
+            if key not in self.range_totals:
+                self.range_totals[key] = {role: dict(heroes) for role, heroes in self.aggregates.totals(*key).items()}
+            return self.range_totals[key]
+
+    def precompute_hero_stats(self, date_ranges: list):
+        for start_date, end_date in date_ranges:
+            self.range_totals_for(start_date, end_date)
+            #  bootstraps the intervals of every hero played in the range, so later tables only bootstrap changes
+            self.hero_tables(start_date, end_date)
 
+    def get_stats_for_hero(self, start_date, end_date, hero_name, build=None):
+        """
+        @return: the average placement, the number of matches, the placement histogram, and the interval_metrics
+        """
+        answer = self.query((start_date, end_date), [hero_name], "StartingHero", None,
+                            ['matches', 'avg_place', *totals_columns[5:], *interval_metrics], build)
+        num_matches = int(answer['matches'].iloc[0])
+        avg_place = float(answer['avg_place'].iloc[0])
+        histogram = (answer[totals_columns[5:]].values[0], np.arange(1, 10))
+        return avg_place, num_matches, histogram, answer[interval_metrics].values[0].tolist()
+
+    def hero_counts(self, start_date=None, end_date=None, hero_type="StartingHero"):
+        """
+        @return: hero -> number of matches played as that hero in the date range. The counts over the whole history
+        are kept up to date as matches are added, so they're never recounted. Treat them as read-only.
+        """
+        if start_date is not None or end_date is not None:
+            return self.query((start_date, end_date), None, hero_type, "hero", ["matches"])['matches'].to_dict()
+        with self.lock:
+            if hero_type not in self.all_hero_counts:
+                self.all_hero_counts[hero_type] = \
+                    self.query((None, None), None, hero_type, "hero", ["matches"])['matches'].to_dict()
+            return self.all_hero_counts[hero_type]
+
+    def cumulative_mmr(self, last=None):
+        """
+        @param last: how many of the latest matches to include, or None for all of them
+        @return: the running total of the MMR changes over the latest matches, in the order they were played
+        """
+        with self.lock:
+            if self.mmr_totals is None:
+                df = self.df
+                mmr_changes = df['+/-MMR'].to_numpy(dtype=np.int64)
+                self.mmr_totals = np.cumsum(np.concatenate([[0], mmr_changes]))
+                self.num_mmr_totals = len(mmr_changes)
+                self.last_day = df['Timestamp'].iloc[-1].strftime("%Y-%m-%d") if len(df.index) else ""
+            count = self.num_mmr_totals if last is None else min(last, self.num_mmr_totals)
+            totals = self.mmr_totals[self.num_mmr_totals - count:self.num_mmr_totals + 1]
+            return totals[1:] - totals[0]
+
+    def append_mmr(self, day: str, mmr_change: int):
+        """
+        Extend the running MMR total with a new match, if it'll be sorted to the end of the match history
+        """
+        if self.mmr_totals is None:
+            return
+        if day < self.last_day:
+            self.mmr_totals = None
+            return
+        if self.num_mmr_totals + 1 >= len(self.mmr_totals):
+            #  grow by doubling, so appending stays constant time
+            self.mmr_totals = np.concatenate([self.mmr_totals, np.zeros(len(self.mmr_totals), dtype=np.int64)])
+        self.mmr_totals[self.num_mmr_totals + 1] = self.mmr_totals[self.num_mmr_totals] + mmr_change
+        self.num_mmr_totals += 1
+        self.last_day = day
+
+    def clear_series(self):
+        """
+        Drop the running MMR total and hero counts, to be rebuilt when they're next needed
+        """
+        self.mmr_totals = None
+        self.all_hero_counts.clear()
 
     def delete_entry(self, row, reverse=False):
-        index = len(self.df.index) - row - 1 if reverse else row
-        self.df = self.df.drop(self.df.index[index])
+        with self.lock:
+            index = len(self.df.index) - row - 1 if reverse else row
+            #  the deletion is journaled like a new match, so the stats file isn't rewritten on the GUI thread
+            self.journal.append({"Deleted": self.match_record(index)})
+            self.remove_row(index)
+            self.journaled += 1
+        if self.journaled >= compaction_threshold:
+            self.start_compaction()
+
+    def match_record(self, index: int):
+        """
+        @return: the match at the position in the match history, as it's journaled
+        """
+        starting_hero, ending_hero, placement, timestamp, mmr_change, session_id, build = \
+            self.df.iloc[index][stats_columns]
+        return {"StartingHero": str(starting_hero), "EndingHero": str(ending_hero), "Placement": str(placement),
+                "Timestamp": timestamp.strftime("%Y-%m-%d"), "+/-MMR": str(mmr_change), "SessionId": str(session_id),
+                "BuildId": str(build)}
+
+    def remove_match(self, match: dict):
+        """
+        Remove a journaled deletion from the match history, if the match is still in it
+        @param match: the match, as returned by match_record
+        """
+        with self.lock:
+            for index in np.flatnonzero((self.df['SessionId'] == match["SessionId"]).to_numpy(dtype=bool)):
+                if self.match_record(index) == match:
+                    self.remove_row(index)
+                    return
+
+    def remove_row(self, index: int):
+        with self.lock:
+            starting_hero, ending_hero, placement, timestamp, mmr_change, _, build = self.df.iloc[index][stats_columns]
+            self.aggregates.remove(starting_hero, ending_hero, placement, mmr_change, timestamp.strftime("%Y-%m-%d"),
+                                   build)
+            self.df = self.df.drop(self.df.index[index]).reset_index(drop=True)
+            self.history_orders.clear()
+            self.range_totals.clear()
+            self.query_results.clear()
+            self.clear_series()
+            self.session_ids = set(self.df['SessionId'].to_numpy())
 
     def import_matches(self, progress_handler=None):
         save_dir = paths.sbb_root
         filenames = save_dir.glob("record_*.txt")
         sorted_by_recent = sorted(filenames, key=os.path.getctime)
         i = 0
-        for game in sorted_by_recent:
-            match = extract_endgame_stats_from_record_file(game)
-            if match:
-                # print(match)
-                self.update_stats(*match)
-            if progress_handler:
-                progress_handler(i, len(sorted_by_recent) - 1)
-                i += 1
+        with self.journal.batch():
+            for game in sorted_by_recent:
+                match = extract_endgame_stats_from_record_file(game)
+                if match:
+                    # print(match)
+                    self.update_stats(*match)
+                if progress_handler:
+                    progress_handler(i, len(sorted_by_recent) - 1)
+                    i += 1
+        self.start_compaction()
 
     def save_match_info(self, match_info, session_id):
-        match_file = paths.matches_dir.joinpath(f"{session_id}.json")
-        with open(match_file, 'w') as f:
-            json.dump(match_info, f)
+        self.match_archive.add(session_id, match_info)
+        self.card_index.add(session_id, match_info)
+        self.opponent_index.add(session_id, match_info)
+
+    def backfill_match_info(self):
+        """
+        Move any legacy per-match JSON files into the archive, index the cards and opponents of any archived
+        matches that haven't been yet, and fill in the builds of matches recorded before builds were
+        """
+        self.match_archive.migrate(paths.matches_dir)
+        with self.lock:
+            df = self.df
+            unbuilt = set(df['SessionId'].to_numpy()[(df['BuildId'] == "").to_numpy(dtype=bool)])
+        builds = {}
+        with self.card_index.batch(), self.opponent_index.batch():
+            for session_id in self.match_archive.sessions():
+                if self.closed:
+                    return
+                try:
+                    if session_id not in self.card_index:
+                        self.card_index.add(session_id, self.match_archive.get_match(session_id))
+                    if session_id not in self.opponent_index or session_id in unbuilt:
+                        summary = self.match_archive.get_summary(session_id)
+                        self.opponent_index.add(session_id, summary)
+                        if session_id in unbuilt and summary.get("build-id"):
+                            builds[session_id] = summary["build-id"]
+                except Exception:
+                    logging.exception(f"Couldn't index {session_id}")
+        if builds:
+            self.assign_builds(builds)
+
+    def assign_builds(self, builds: dict):
+        """
+        Fill in the builds of matches that were recorded without one
+        @param builds: session id -> build id
+        """
+        with self.lock:
+            df = self.df
+            missing = (df['BuildId'] == "").to_numpy(dtype=bool)
+            found = pd.Series(df['SessionId'].to_numpy()).map(builds).notna().to_numpy(dtype=bool)
+            if not (missing & found).any():
+                return
+            build_ids = df['BuildId'].astype(object).to_numpy(copy=True)
+            build_ids[missing & found] = [builds[session_id]
+                                          for session_id in df['SessionId'].to_numpy()[missing & found]]
+            self.df = df.assign(BuildId=pd.Categorical(build_ids))
+            self.aggregates.add_builds(self.df[missing & found])
+            self.query_results.clear()
+        #  the builds aren't journaled, so they go straight into the stats file
+        self.start_compaction()
+
+    def card_stats(self, cards: list, final_board=True):
+        """
+        @param cards: (template id, golden) pairs, with golden None for either
+        @param final_board: only count the player's board in their last combat, rather than any of their boards
+        @return: the number of matches with all of the cards on the player's board, the average placement in them,
+        and the net MMR
+        """
+        session_ids = self.card_index.matches_with(cards, final_board)
+        matches = self.query(group_by="match", metrics=["SessionId", "Placement", "+/-MMR"])
+        matches = matches[matches['SessionId'].isin(session_ids)]
+        num_matches = len(matches.index)
+        avg_place = round(float(matches['Placement'].mean()), 2) if num_matches else 0.00
+        return num_matches, avg_place, int(matches['+/-MMR'].sum())
+
+    def opponent_history(self, player_id: str):
+        """
+        @return: the number of matches against the player, their average placement, and hero -> (matches, average
+        placement); or None if the player's never been faced
+        """
+        return self.opponent_index.lookup(player_id)
+
+    def get_match_info(self, session_id):
+        return self.match_archive.get_match(session_id)
+
+    def get_combat(self, session_id, round_number):
+        return self.match_archive.get_combat(session_id, round_number)
 
 
 def extract_endgame_stats_from_record_file(filename):
+    #  the record parser is only needed when importing old matches
+    from construct import GreedyRange
+    from sbbtracker.parsers.record_parser import STRUCT_ACTION, id_to_action_name
     with open(filename, 'rb') as f:
         result = GreedyRange(STRUCT_ACTION).parse_stream(f)
         remaining_binary_contents = f.read()
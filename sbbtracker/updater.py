@@ -7,7 +7,6 @@ import time
 from pathlib import Path
 from urllib.request import urlretrieve
 
-import requests
 from PySide6.QtCore import QObject, QThread, Signal
 from packaging import version as vs
 
@@ -19,6 +18,7 @@ latest_release_url = "https://api.github.com/repos/SBBTracker/SBBTracker/release
 
 
 def check_updates():
+    import requests
     r = requests.get(latest_release_url)
     try:
         response = json.loads(r.text)
@@ -32,6 +32,7 @@ def check_updates():
 
 
 def self_update(progress_handler):
+    import requests
     release_request = requests.get(latest_release_url)
     response = json.loads(release_request.text)
     download_url = None
@@ -22,6 +22,9 @@ def get_asset(asset_name: str):
 with open(get_asset("template-ids.json"), "r") as json_file:
     content_id_lookup = json.load(json_file)
 
+hero_names = [v['Name'] for v in content_id_lookup.values()
+              if v['Id'].startswith("SBB_HERO") and v['Name'] != "Big Bad Wolf"]
+
 
 def get_card_art_name(template_id: str, is_golden: bool):
     """
@@ -46,7 +49,7 @@ def get_card_name(template_id: str, is_golden=False):
 
 
 def get_num_heroes():
-    return len([v for v in content_id_lookup.values() if v['Id'].startswith("SBB_HERO") and v['Name'] != "Big Bad Wolf"])
+    return len(hero_names)
 
 
 def get_card_path(content_id: str, is_golden: bool):
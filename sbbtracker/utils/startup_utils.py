@@ -0,0 +1,60 @@
+import importlib
+import logging
+import sys
+import time
+
+import_budget = 2.0  # seconds from launch to main() starting to put up the splash screen
+startup_budget = 5.0  # seconds from launch to the main window being shown
+
+logger = logging.getLogger("startup")
+logger.setLevel(logging.INFO)
+
+
+class StartupReport:
+    """
+    Times each step of starting the app, so slow starts can be tracked down from the log. Steps are either imports,
+    which also count the modules they pulled in, or stages of setting up the app.
+    """
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.last = self.start
+        self.steps = []  # (kind, name, seconds, modules loaded)
+        self.modules = len(sys.modules)
+
+    def record(self, kind: str, name: str, began: float, modules: int):
+        now = time.perf_counter()
+        self.steps.append((kind, name, now - began, len(sys.modules) - modules))
+        self.last = now
+        self.modules = len(sys.modules)
+
+    def checkpoint(self, name: str):
+        """
+        Record everything since the last step as a stage
+        """
+        self.record("stage", name, self.last, self.modules)
+
+    def import_module(self, name: str):
+        """
+        Import a module, timing it as its own step. Modules it shares with earlier imports were already loaded, so
+        each import is only charged for what it adds.
+        @return: the module
+        """
+        began = time.perf_counter()
+        modules = len(sys.modules)
+        module = importlib.import_module(name)
+        self.record("import", name, began, modules)
+        return module
+
+    def total(self):
+        return self.last - self.start
+
+    def log(self):
+        lines = [f"Started in {self.total():.2f}s"]
+        for kind, name, seconds, modules in self.steps:
+            lines.append(f"  {kind:<6} {name:<40} {seconds * 1000:8.1f}ms  {modules:4} modules")
+        logger.info("\n".join(lines))
+        imports = sum(seconds for kind, name, seconds, modules in self.steps if name == "Imports")
+        if imports > import_budget:
+            logger.warning(f"Imports took {imports:.2f}s, over the {import_budget:.0f}s budget")
+        if self.total() > startup_budget:
+            logger.warning(f"Startup took {self.total():.2f}s, over the {startup_budget:.0f}s budget")
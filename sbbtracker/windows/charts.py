@@ -0,0 +1,353 @@
+import logging
+import math
+from collections import namedtuple
+from queue import Queue
+
+import numpy as np
+from PySide6.QtCore import QPointF, QRectF, QThread, Qt, Signal
+from PySide6.QtGui import QColor, QFont, QFontMetrics, QImage, QPainter, QPen, QPolygonF
+from PySide6.QtWidgets import QWidget
+
+from sbbtracker.windows.constants import default_bg_color
+
+#  a line of a line chart, with the annotation drawn at its last point
+LineSeries = namedtuple("LineSeries", ["label", "x", "y", "color", "alpha", "annotation"])
+#  everything drawn on a chart, fixed at the time it's handed to the renderer
+ChartSnapshot = namedtuple("ChartSnapshot", ["title", "xlabel", "ylabel", "lines", "bars", "hlines", "legend"])
+grid_color = "#4a5157"
+text_color = "white"
+#  room left around the plot for the title, tick labels and axis labels
+margins = (58, 34, 20, 46)  # left, top, right, bottom
+
+
+def nice_ticks(low, high, max_ticks=8, integer=False):
+    """
+    @return: evenly spaced round tick values covering low to high
+    """
+    if high <= low:
+        high = low + 1
+    raw_step = (high - low) / max_ticks
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    multiples = [1, 2, 5, 10] if integer else [1, 2, 2.5, 5, 10]
+    step = next(multiple * magnitude for multiple in multiples if multiple * magnitude >= raw_step)
+    if integer:
+        step = max(1, round(step))
+    first = math.floor(low / step) * step
+    last = math.ceil(high / step) * step
+    return list(np.arange(first, last + step / 2, step))
+
+
+def downsample(x, y, threshold: int):
+    """
+    Largest-Triangle-Three-Buckets downsampling: keep the first and last points, and from each of the buckets in
+    between the point making the largest triangle with the point kept before it and the average of the next bucket.
+    The shape of the line survives even though only about threshold points are left to draw.
+    @return: the x and y of the kept points
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    if threshold < 3 or len(x) <= threshold:
+        return x, y
+    edges = np.linspace(1, len(x) - 1, threshold - 1).astype(int)
+    #  the average of each bucket, to measure the triangles against
+    sums_x = np.add.reduceat(x[1:-1], edges[:-1] - 1)
+    sums_y = np.add.reduceat(y[1:-1], edges[:-1] - 1)
+    sizes = np.diff(edges)
+    averages_x = np.append(sums_x / sizes, x[-1])
+    averages_y = np.append(sums_y / sizes, y[-1])
+    kept = [0]
+    for bucket in range(len(sizes)):
+        start, end = edges[bucket], edges[bucket + 1]
+        previous = kept[-1]
+        areas = np.abs((x[previous] - averages_x[bucket + 1]) * (y[start:end] - y[previous])
+                       - (x[previous] - x[start:end]) * (averages_y[bucket + 1] - y[previous]))
+        kept.append(start + int(areas.argmax()))
+    kept.append(len(x) - 1)
+    return x[kept], y[kept]
+
+
+def tick_label(value):
+    return str(int(value)) if float(value).is_integer() else f"{value:g}"
+
+
+def chart_limits(chart: ChartSnapshot):
+    """
+    @return: the x ticks and y ticks, whose ends are the limits of the plot
+    """
+    if chart.bars is not None:
+        positions, heights, _, horizontal = chart.bars
+        value_ticks = nice_ticks(0, max(heights.max(initial=0), 1), integer=True)
+        if horizontal:
+            return value_ticks, []
+        return [float(position) for position in positions], value_ticks
+    #  empty lines (e.g. no matches played yet) don't count towards the limits
+    xs = np.concatenate([np.zeros(0)] + [np.asarray(line.x, dtype=float) for line in chart.lines])
+    ys = np.concatenate([np.zeros(0)] + [np.asarray(line.y, dtype=float) for line in chart.lines]
+                        + [np.array([y for y, _ in chart.hlines], dtype=float)])
+    if xs.size == 0:
+        xs = np.zeros(1)
+    if ys.size == 0:
+        ys = np.zeros(1)
+    return nice_ticks(xs.min(), xs.max(), integer=True), nice_ticks(ys.min(), ys.max(), integer=True)
+
+
+def draw_chart(painter: QPainter, chart: ChartSnapshot, width: int, height: int, downsampled=downsample):
+    """
+    @param downsampled: used in place of downsample, e.g. to cache the downsampled lines between renders
+    """
+    painter.setRenderHints(QPainter.Antialiasing | QPainter.TextAntialiasing)
+    painter.fillRect(QRectF(0, 0, width, height), QColor(default_bg_color))
+    font = QFont("Roboto", 9)
+    painter.setFont(font)
+    metrics = QFontMetrics(font)
+
+    left, top, right, bottom = margins
+    if chart.bars is not None and chart.bars[3]:
+        #  horizontal bars are labelled by name on the left
+        left = max([metrics.horizontalAdvance(str(name)) for name in chart.bars[0]], default=0) + 12
+    plot = QRectF(left, top, max(width - left - right, 1), max(height - top - bottom, 1))
+
+    x_ticks, y_ticks = chart_limits(chart)
+    if chart.bars is not None and not chart.bars[3]:
+        x_low, x_high = x_ticks[0] - .5, x_ticks[-1] + .5
+    else:
+        x_low, x_high = x_ticks[0], x_ticks[-1]
+    y_low, y_high = (y_ticks[0], y_ticks[-1]) if y_ticks else (0, 1)
+
+    def to_x(x):
+        return plot.left() + (x - x_low) / ((x_high - x_low) or 1) * plot.width()
+
+    def to_y(y):
+        return plot.bottom() - (y - y_low) / ((y_high - y_low) or 1) * plot.height()
+
+    #  grid and tick labels
+    painter.setPen(QPen(QColor(grid_color), 1))
+    for x in x_ticks:
+        painter.drawLine(QPointF(to_x(x), plot.top()), QPointF(to_x(x), plot.bottom()))
+    for y in y_ticks:
+        painter.drawLine(QPointF(plot.left(), to_y(y)), QPointF(plot.right(), to_y(y)))
+    painter.setPen(QColor(text_color))
+    for x in x_ticks:
+        painter.drawText(QRectF(to_x(x) - 30, plot.bottom() + 4, 60, metrics.height()),
+                         Qt.AlignHCenter | Qt.AlignTop, tick_label(x))
+    for y in y_ticks:
+        painter.drawText(QRectF(0, to_y(y) - metrics.height() / 2, plot.left() - 6, metrics.height()),
+                         Qt.AlignRight | Qt.AlignVCenter, tick_label(y))
+
+    if chart.bars is not None:
+        draw_bars(painter, chart, plot, to_x, to_y)
+    else:
+        draw_lines(painter, chart, plot, to_x, to_y, metrics, downsampled)
+
+    #  title and axis labels
+    painter.setPen(QColor(text_color))
+    painter.drawText(QRectF(plot.left(), plot.bottom() + metrics.height() + 8, plot.width(), metrics.height()),
+                     Qt.AlignHCenter, chart.xlabel)
+    if chart.ylabel:
+        painter.save()
+        painter.translate(12, plot.center().y())
+        painter.rotate(-90)
+        painter.drawText(QRectF(-plot.height() / 2, -metrics.height() / 2, plot.height(), metrics.height()),
+                         Qt.AlignHCenter, chart.ylabel)
+        painter.restore()
+    painter.setFont(QFont("Roboto", 11))
+    painter.drawText(QRectF(plot.left(), 0, plot.width(), top), Qt.AlignCenter, chart.title)
+
+
+def draw_bars(painter: QPainter, chart: ChartSnapshot, plot: QRectF, to_x, to_y):
+    positions, heights, color, horizontal = chart.bars
+    painter.setPen(Qt.NoPen)
+    painter.setBrush(QColor(color))
+    if horizontal:
+        row_height = plot.height() / max(len(positions), 1)
+        for index, (name, height) in enumerate(zip(positions, heights)):
+            row_top = plot.top() + index * row_height
+            painter.drawRect(QRectF(plot.left(), row_top + row_height * .1,
+                                    to_x(height) - plot.left(), row_height * .8))
+            painter.setPen(QColor(text_color))
+            painter.drawText(QRectF(0, row_top, plot.left() - 6, row_height),
+                             Qt.AlignRight | Qt.AlignVCenter, str(name))
+            painter.setPen(Qt.NoPen)
+    else:
+        for position, height in zip(positions, heights):
+            painter.drawRect(QRectF(to_x(position - .5), to_y(height),
+                                    to_x(position + .5) - to_x(position - .5), to_y(0) - to_y(height)))
+
+
+def draw_lines(painter: QPainter, chart: ChartSnapshot, plot: QRectF, to_x, to_y, metrics: QFontMetrics,
+               downsampled=downsample):
+    painter.setClipRect(plot.adjusted(-2, -2, 2, 2))
+    for y, color in chart.hlines:
+        painter.setPen(QPen(QColor(color), 2))
+        painter.drawLine(QPointF(plot.left(), to_y(y)), QPointF(plot.right(), to_y(y)))
+    for line in chart.lines:
+        color = QColor(line.color)
+        color.setAlphaF(line.alpha)
+        painter.setPen(QPen(color, 3))
+        #  no more than a point per pixel is ever drawn, however long the line
+        xs, ys = downsampled(line.x, line.y, int(plot.width()))
+        painter.drawPolyline(QPolygonF([QPointF(to_x(x), to_y(y)) for x, y in zip(xs, ys)]))
+    painter.setClipping(False)
+    painter.setPen(QColor(text_color))
+    for line in chart.lines:
+        if line.annotation is not None and len(line.x):
+            painter.drawText(QPointF(to_x(line.x[-1]) + 3, to_y(line.y[-1]) - 3), str(line.annotation))
+
+    if chart.legend and chart.lines:
+        row_height = metrics.height() + 2
+        width = max(metrics.horizontalAdvance(str(line.label)) for line in chart.lines) + 34
+        box = QRectF(plot.right() - width - 6, plot.top() + 6, width, row_height * len(chart.lines) + 8)
+        painter.setPen(QPen(QColor(grid_color), 1))
+        painter.setBrush(QColor(default_bg_color))
+        painter.drawRect(box)
+        for index, line in enumerate(chart.lines):
+            y = box.top() + 4 + index * row_height + row_height / 2
+            color = QColor(line.color)
+            color.setAlphaF(line.alpha)
+            painter.setPen(QPen(color, 3))
+            painter.drawLine(QPointF(box.left() + 6, y), QPointF(box.left() + 24, y))
+            #  the labels are coloured like their lines
+            painter.setPen(QColor(line.color))
+            painter.drawText(QRectF(box.left() + 28, y - row_height / 2, width - 30, row_height),
+                             Qt.AlignLeft | Qt.AlignVCenter, str(line.label))
+
+
+class ChartRenderer(QThread):
+    """
+    Rasterises charts into images off the GUI thread. Each job is a snapshot of a chart, so the chart can keep
+    changing while it's drawn. When several jobs for the same chart are waiting only the newest is drawn, and a
+    finished image is only posted back if no newer job for the chart has been submitted since.
+    """
+    rendered = Signal(object, int, QImage)
+
+    def __init__(self):
+        super(ChartRenderer, self).__init__()
+        self.jobs = Queue()
+        #  chart id -> (id(x), id(y), width) -> (x, y, the line's points downsampled to the width), for the lines of
+        #  each chart's last render. The points are kept so their ids can't be reused while they're cached.
+        self.downsampled_lines = {}
+
+    def run(self):
+        while True:
+            jobs = [self.jobs.get()]
+            while not self.jobs.empty():
+                jobs.append(self.jobs.get_nowait())
+            latest = {}
+            for job in jobs:
+                latest[id(job[0])] = job
+            for widget, generation, snapshot, width, height, pixel_ratio in latest.values():
+                if generation != widget.generation:
+                    continue
+                try:
+                    image = QImage(max(int(width * pixel_ratio), 1), max(int(height * pixel_ratio), 1),
+                                   QImage.Format_ARGB32_Premultiplied)
+                    image.setDevicePixelRatio(pixel_ratio)
+                    painter = QPainter(image)
+                    draw_chart(painter, snapshot, width, height, self.downsampler(widget))
+                    painter.end()
+                except Exception:
+                    logging.exception("Couldn't draw a chart")
+                    continue
+                if generation == widget.generation:
+                    self.rendered.emit(widget, generation, image)
+
+    def downsampler(self, widget):
+        """
+        @return: a downsample for rendering the widget's chart, which reuses the lines downsampled for its last render
+        """
+        cached = self.downsampled_lines.get(id(widget), {})
+        used = self.downsampled_lines[id(widget)] = {}
+
+        def downsampled(x, y, threshold: int):
+            key = (id(x), id(y), threshold)
+            used[key] = cached[key] if key in cached else (x, y, downsample(x, y, threshold))
+            return used[key][2]
+
+        return downsampled
+
+
+renderer = None
+
+
+def get_renderer():
+    global renderer
+    if renderer is None:
+        renderer = ChartRenderer()
+        renderer.start()
+    return renderer
+
+
+def stop_renderer():
+    if renderer is not None:
+        renderer.terminate()
+
+
+class ChartWidget(QWidget):
+    """
+    A lightweight chart drawn with QPainter: line series with end-of-line annotations and a legend, vertical bars
+    (e.g. a placement histogram), or horizontal bars for named categories. Charts are rasterised by the
+    ChartRenderer thread and the widget only paints the finished image, so the GUI thread never lays out or draws
+    a chart. Nothing is rendered while the chart isn't on screen.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.snapshot = ChartSnapshot("", "", "", (), None, (), False)
+        self.generation = 0  # bumped whenever the chart changes, so older renders can be dropped
+        self.image = None
+        self.image_generation = -1
+        get_renderer().rendered.connect(self.set_image)
+
+    def set_labels(self, title="", xlabel="", ylabel=""):
+        self.change(title=title, xlabel=xlabel, ylabel=ylabel)
+
+    def set_lines(self, lines: list, legend=True, hlines=()):
+        """
+        @param lines: the LineSeries, in legend order
+        @param hlines: (y, color) for horizontal reference lines
+        """
+        self.change(lines=tuple(lines), bars=None, legend=legend, hlines=tuple(hlines))
+
+    def set_bars(self, positions, heights, color, horizontal=False):
+        """
+        @param positions: the x position of each bar, or the category names top to bottom for horizontal bars
+        @param heights: the length of each bar
+        """
+        self.change(bars=(tuple(positions), np.array(heights, dtype=float), color, horizontal),
+                    lines=(), hlines=(), legend=False)
+
+    def clear(self):
+        self.change(lines=(), bars=None, hlines=())
+
+    def change(self, **changes):
+        self.snapshot = self.snapshot._replace(**changes)
+        self.generation += 1
+        self.request_render()
+
+    def request_render(self):
+        if self.isVisible() and self.image_generation != self.generation:
+            get_renderer().jobs.put((self, self.generation, self.snapshot, self.width(), self.height(),
+                                     self.devicePixelRatioF()))
+
+    def set_image(self, widget, generation: int, image: QImage):
+        if widget is self and generation == self.generation:
+            self.image = image
+            self.image_generation = generation
+            self.update()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.request_render()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.generation += 1
+        self.request_render()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        if self.image is None:
+            painter.fillRect(self.rect(), QColor(default_bg_color))
+        else:
+            #  until the render at the new size arrives, stretch the last one
+            painter.drawImage(self.rect(), self.image)
+        painter.end()
@@ -15,24 +15,20 @@ from pathlib import Path
 from queue import Queue
 from statistics import mean
 
-import matplotlib
 import numpy as np
 import pandas as pd
-import requests
 
 from sbbtracker import graphs, paths, settings, stats, updater, version
 from sbbtracker.languages import tr
 from sbbtracker.utils.qt_utils import open_url
 from sbbtracker.utils.sbb_logic_utils import round_to_xp
+from sbbtracker.windows.charts import ChartWidget, stop_renderer
 from sbbtracker.windows.constants import default_bg_color, primary_color
 from sbbtracker.windows.overlays import BoardComp, OverlayWindow, StreamableMatchDisplay, StreamerOverlayWindow
 from sbbtracker.windows.settings_window import SettingsWindow
 from sbbtracker.windows.shop_display import ShopDisplay
 
-matplotlib.use('Qt5Agg')
-import matplotlib.pyplot as plt
-
-from PySide6.QtCore import QSize, QThread, QUrl, Qt, Signal
+from PySide6.QtCore import QAbstractTableModel, QModelIndex, QSize, QThread, QUrl, Qt, Signal
 from PySide6.QtGui import QAction, QDesktopServices, QFont, QIcon, \
     QPixmap
 from PySide6.QtWidgets import (
@@ -42,19 +38,15 @@ from PySide6.QtWidgets import (
     QLabel,
     QMainWindow,
     QMenu, QMessageBox, QProgressBar, QPushButton, QSizePolicy, QTabWidget,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QToolBar,
     QVBoxLayout,
     QWidget,
 )
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg
 
 from sbbtracker.utils import asset_utils
 from sbbtracker.parsers import log_parser
 
-from sbbbattlesim import from_state, simulate
-from sbbbattlesim.exceptions import SBBBSCrocException
 from sbbtracker.utils.sbb_window_utils import SBBWindowCheckThread
 
 round_font = QFont("Roboto", 18)
@@ -62,16 +54,9 @@ round_font = QFont("Roboto", 18)
 patch_notes_file = paths.sbbtracker_folder.joinpath("patch_notes.txt")
 
 
-def update_table(table: QTableWidget, data: list[list]):
-    for row in range(len(data)):
-        for column in range(len(data[0])):
-            datum = (data[row][column])
-            table.setItem(row, column, QTableWidgetItem(str(datum)))
-
-
 all_matches = tr("All Matches")
-latest_patch = tr("Latest Patch") + " (68.9)"
-prev_patch = tr("Previous Patch") + " (67.5)"
+latest_patch = tr("Latest Patch")
+prev_patch = tr("Previous Patch")
 today_ = tr("Today")
 yesterday = tr("Yesterday")
 last_7 = tr("Last 7 days")
@@ -110,6 +95,20 @@ def get_date_range(key):
         return first_day_prev_month.isoformat(), last_day_prev_month.isoformat()
 
 
+def get_stats_filter(key, player_stats: stats.PlayerStats):
+    """
+    Resolve a filter to the date range and build to query the stats with. The patches are the builds the matches
+    were played on, so they follow game updates; until enough builds have been seen they fall back to dates.
+    @return: ((start date, end date), build id or None)
+    """
+    builds = player_stats.builds()
+    if key == latest_patch and len(builds) >= 1:
+        return (None, None), builds[-1]
+    elif key == prev_patch and len(builds) >= 2:
+        return (None, None), builds[-2]
+    return get_date_range(key), None
+
+
 api_url = "https://9n2ntsouxb.execute-api.us-east-1.amazonaws.com/prod/api/v1/game"
 api_id = settings.get(settings.api_key)
 if not api_id:
@@ -117,6 +116,7 @@ if not api_id:
 
 
 def upload_data(payload):
+    import requests
     try:
         resp = requests.post(api_url, data=json.dumps(payload))
         print(resp.content)
@@ -135,6 +135,9 @@ class SimulationThread(QThread):
     def run(self):
         while True:
             board, playerid, num_simulations, num_threads, round_number = self.comp_queue.get()
+            #  the simulator is only loaded once there's a board to simulate
+            from sbbbattlesim import from_state, simulate
+            from sbbbattlesim.exceptions import SBBBSCrocException
             simulation_stats = None
 
             if playerid is None:
@@ -187,6 +190,60 @@ class SimulationThread(QThread):
             time.sleep(1)
 
 
+class StatsLoadThread(QThread):
+    stats_loaded = Signal(object)
+    load_failed = Signal()
+
+    def run(self):
+        start = time.perf_counter()
+        try:
+            player_stats = stats.PlayerStats()
+            player_stats.precompute_hero_stats([get_date_range(key) for key in default_dates])
+        except Exception:
+            logging.exception("Couldn't load the stats")
+            self.load_failed.emit()
+            return
+        logging.info(f"Loaded {len(player_stats.df.index)} matches in {time.perf_counter() - start:.2f}s")
+        self.stats_loaded.emit(player_stats)
+
+
+class StatsWorker(QThread):
+    """
+    Works out the hero stats tables off the GUI thread. Only the latest request is worked on: any requests that
+    are still waiting when it's picked up are dropped, and results that have been superseded are never posted.
+    """
+    tables_ready = Signal(int, list)
+
+    def __init__(self):
+        super(StatsWorker, self).__init__()
+        self.requests = Queue()
+        self.generation = 0
+
+    def request(self, player_stats: stats.PlayerStats, date_range, build):
+        """
+        @return: the generation of the request, posted back with its results
+        """
+        self.generation += 1
+        self.requests.put((self.generation, player_stats, date_range, build))
+        return self.generation
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            while not self.requests.empty():
+                request = self.requests.get_nowait()
+            generation, player_stats, (start, end), build = request
+            if generation != self.generation:
+                continue
+            try:
+                tables = player_stats.hero_tables(start, end, build)
+            except Exception:
+                logging.exception("Couldn't generate the hero stats")
+                continue
+            if generation == self.generation:
+                self.tables_ready.emit(generation, tables)
+
+
 class LogThread(QThread):
     round_update = Signal(int)
     player_update = Signal(object, int)
@@ -261,6 +318,7 @@ class LogThread(QThread):
             elif job == log_parser.JOB_BOARDINFO:
                 self.comp_update.emit(state, round_number)
 
+                from sbbbattlesim import from_state
                 combat = from_state(state)
                 combat["round"] = round_number
                 combats.append(combat)
@@ -293,7 +351,8 @@ class SBBTracker(QMainWindow):
         self.comps = [BoardComp(self) for _ in range(0, 8)]
         self.round_indicator = QLabel(tr("Waiting for match to start..."))
         self.round_indicator.setFont(round_font)
-        self.player_stats = stats.PlayerStats()
+        self.player_stats = None  # loaded in the background, see stats_loaded
+        self.queued_stats_updates = []
         self.player_ids = []
         self.most_recent_combat = None
         self.in_matchmaking = False
@@ -331,9 +390,9 @@ class SBBTracker(QMainWindow):
         layout.addWidget(round_widget)
         layout.addWidget(self.comp_tabs)
 
-        self.match_history = MatchHistory(self, self.player_stats)
+        self.match_history = MatchHistory(self)
         self.live_graphs = LiveGraphs()
-        self.stats_graph = StatsGraph(self.player_stats)
+        self.stats_graph = StatsGraph()
         self.hero_selection = HeroSelection(self)
 
         main_tabs = QTabWidget()
@@ -344,6 +403,10 @@ class SBBTracker(QMainWindow):
         main_tabs.addTab(self.stats_graph, tr("Stats Graphs"))
 
         self.main_tabs = main_tabs
+        self.stats_tabs = [main_tabs.indexOf(self.match_history), main_tabs.indexOf(self.stats_graph)]
+        for index in self.stats_tabs:
+            main_tabs.setTabEnabled(index, False)
+            main_tabs.setTabToolTip(index, tr("Loading stats..."))
 
         toolbar = QToolBar(self)
         toolbar.setMinimumHeight(40)
@@ -431,13 +494,42 @@ class SBBTracker(QMainWindow):
         self.sbb_watcher_thread.changed_foreground.connect(self.overlay.visible_in_bg)
         self.sbb_watcher_thread.changed_rect.connect(self.overlay.set_rect)
 
+        self.stats_loader = StatsLoadThread()
+        self.stats_loader.stats_loaded.connect(self.stats_loaded)
+        self.stats_loader.load_failed.connect(self.stats_load_failed)
+
         self.resize(1300, 800)
 
+        self.stats_loader.start()
         self.sbb_watcher_thread.start()
         self.log_updates.start()
         self.github_updates.start()
         self.simulation.start()
 
+    def stats_loaded(self, player_stats: stats.PlayerStats):
+        self.player_stats = player_stats
+        self.match_history.set_player_stats(player_stats)
+        self.stats_graph.set_player_stats(player_stats)
+        for index in self.stats_tabs:
+            self.main_tabs.setTabEnabled(index, True)
+            self.main_tabs.setTabToolTip(index, "")
+        for update in self.queued_stats_updates:
+            self.update_stats(*update)
+        self.queued_stats_updates.clear()
+
+    def stats_load_failed(self):
+        """
+        Carry on with empty stats, so matches played this session are still recorded
+        """
+        try:
+            player_stats = stats.PlayerStats(load_history=False)
+        except Exception:
+            logging.exception("Couldn't open the stats, matches played this session won't be recorded")
+            self.queued_stats_updates.clear()
+            return
+        self.stats_loaded(player_stats)
+        QMessageBox.warning(self, tr("Stats"), tr("Couldn't load your stats. Check sbbtracker.log for details."))
+
     def get_player_index(self, player_id: str):
         if player_id not in self.player_ids:
             self.player_ids.append(player_id)
@@ -454,6 +546,7 @@ class SBBTracker(QMainWindow):
         self.streamer_overlay.turn_display.setVisible(settings.get(settings.enable_turn_display))
         for index in range(0, 8):
             self.comp_tabs.tabBar().setTabTextColor(index, "white")
+            self.comp_tabs.setTabToolTip(index, "")
             comp = self.comps[index]
             comp.composition = None
             comp.player = None
@@ -489,12 +582,33 @@ class SBBTracker(QMainWindow):
             self.comp_tabs.tabBar().setTabTextColor(index, "red")
             title += tr(" *DEAD*")
         self.comp_tabs.tabBar().setTabText(index, title)
+        #  the first player is the current player, who isn't an opponent
+        if self.player_stats is not None and player.playerid != self.player_ids[0]:
+            self.comp_tabs.setTabToolTip(index, self.opponent_summary(player.playerid, real_hero_name))
         comp = self.get_comp(index)
         comp.player = player
         comp.current_round = round_number
         self.overlay.update_player(index, player.health, f"{player.level}.{player.experience}", round_number, player.place)
         self.update()
 
+    def opponent_summary(self, player_id: str, hero: str):
+        history = self.player_stats.opponent_history(player_id)
+        if history is None:
+            return tr("You haven't faced this player before")
+        matches, avg_place, heroes = history
+        if avg_place is None:
+            summary = tr("Faced {0} times").format(matches)
+        else:
+            summary = tr("Faced {0} times, average place {1}").format(matches, avg_place)
+        if hero in heroes:
+            hero_matches, hero_avg_place = heroes[hero]
+            if hero_avg_place is None:
+                summary += "\n" + tr("With {0}: {1} times").format(hero, hero_matches)
+            else:
+                summary += "\n" + tr("With {0}: {1} times, average place {2}").format(hero, hero_matches,
+                                                                                      hero_avg_place)
+        return summary
+
     def update_comp(self, state, round_number):
         for player_id in state:
             board = state[player_id]
@@ -526,7 +640,11 @@ class SBBTracker(QMainWindow):
                                       settings.get(settings.number_threads, 3), round_number))
 
     def update_stats(self, starting_hero: str, player, session_id: str, match_data):
-        if settings.get(settings.upload_data) and self.in_matchmaking and session_id not in self.player_stats.df['SessionId'].values:
+        if self.player_stats is None:
+            #  the stats are still loading, the match gets added once they're in
+            self.queued_stats_updates.append((starting_hero, player, session_id, match_data))
+            return
+        if settings.get(settings.upload_data) and self.in_matchmaking and not self.player_stats.has_session(session_id):
             # upload only matchmade games
             for round_num in self.sim_results:
                 index = round_num - 1
@@ -536,8 +654,9 @@ class SBBTracker(QMainWindow):
         if settings.get(settings.save_stats, True) and (
                 not settings.get(settings.matchmaking_only) or self.in_matchmaking):
             place = player.place if int(player.health) <= 0 else "1"
+            build_id = match_data.get("build-id", "") if match_data else ""
             self.player_stats.update_stats(starting_hero, asset_utils.get_card_name(player.heroid),
-                                           place, player.mmr, session_id)
+                                           place, player.mmr, session_id, build_id=build_id)
             if match_data:
                 self.player_stats.save_match_info(match_data, session_id)
             self.match_history.update_history_table()
@@ -571,10 +690,12 @@ class SBBTracker(QMainWindow):
             self.streamable_scores.hide()
 
     def update_hero_discover(self, hero_ids):
-        self.hero_selection.update_heroes(hero_ids, self.player_stats, self.overlay)
+        if self.player_stats is not None:
+            self.hero_selection.update_heroes(hero_ids, self.player_stats, self.overlay)
         self.main_tabs.setCurrentIndex(1)
 
     def export_last_comp(self):
+        from sbbbattlesim import from_state
         if self.most_recent_combat:
             with open(paths.sbbtracker_folder.joinpath("last_combat.json"), "w") as file:
                 json.dump(from_state(asset_utils.replace_template_ids(self.most_recent_combat)),
@@ -640,12 +761,12 @@ class SBBTracker(QMainWindow):
         filepath, filetype = QFileDialog.getSaveFileName(parent=None, caption='Export to .csv',
                                                          dir=str(Path(os.environ['USERPROFILE']).joinpath("Documents")),
                                                          filter="Text CSV (*.csv)")
-        if filepath:
+        if filepath and self.player_stats is not None:
             self.player_stats.export(Path(filepath))
 
     def delete_stats(self, window):
         reply = QMessageBox.question(window, tr("Delete all Stats"), tr("Do you want to delete *ALL* saved stats?"))
-        if reply == QMessageBox.Yes:
+        if reply == QMessageBox.Yes and self.player_stats is not None:
             self.player_stats.delete()
             self.match_history.update_history_table()
 
@@ -662,76 +783,167 @@ class SBBTracker(QMainWindow):
         self.log_updates.terminate()
         self.simulation.terminate()
         self.sbb_watcher_thread.terminate()
-        self.player_stats.save()
+        self.match_history.stats_worker.terminate()
+        stop_renderer()
+        if self.player_stats is not None:
+            self.player_stats.close()
         self.overlay.close()
         self.streamer_overlay.close()
         self.streamable_scores.close()
         settings.save()
 
 
+class MatchHistoryModel(QAbstractTableModel):
+    """
+    A table model that reads the match history straight out of the stats store, newest match first.
+    Only the rows the view asks for are ever read, and sorting is done by the store.
+    """
+    columns = ["StartingHero", "EndingHero", "Placement", "+/-MMR"]
+
+    def __init__(self, player_stats: stats.PlayerStats = None):
+        super().__init__()
+        self.player_stats = player_stats
+        self.headings = [tr("Starting Hero"), tr("Ending Hero"), tr("Place"), tr("+/- MMR")]
+        self.sort_col = None
+        self.sort_asc = False
+        self.order = np.array([], dtype=int)
+        self.values = []
+        self.refresh()
+
+    def refresh(self):
+        self.beginResetModel()
+        if self.player_stats is not None:
+            self.order = self.player_stats.history_order(self.sort_col, self.sort_asc)
+            matches = self.player_stats.query(group_by="match", metrics=self.columns)
+            self.values = [matches[column].values for column in self.columns]
+        self.endResetModel()
+
+    def position(self, row: int):
+        """
+        @return: the position in the stats store of the match displayed at the row
+        """
+        return int(self.order[row])
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return str(self.values[index.column()][self.order[index.row()]])
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headings[section]
+        return super().headerData(section, orientation, role)
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self.sort_col = self.columns[column] if column >= 0 else None
+        self.sort_asc = order == Qt.AscendingOrder
+        self.refresh()
+
+
+class HeroStatsModel(QAbstractTableModel):
+    """
+    A table model for the rows generated by the stats store
+    """
+    def __init__(self):
+        super().__init__()
+        self.rows = []
+        self.intervals = []
+        self.headings = [tr(heading) for heading in stats.headings]
+
+    def set_rows(self, rows: list[list], intervals: list = None):
+        """
+        @param intervals: the HeroTable.row_intervals of each row, shown as tooltips on the average place and top 4
+        """
+        self.beginResetModel()
+        self.rows = rows
+        self.intervals = intervals or [None] * len(rows)
+        self.endResetModel()
+
+    def set_headings(self, headings: list[str]):
+        self.headings = headings
+        self.headerDataChanged.emit(Qt.Horizontal, 0, len(headings) - 1)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.headings)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and index.isValid():
+            return str(self.rows[index.row()][index.column()])
+        if role == Qt.ToolTipRole and index.isValid() and self.intervals[index.row()] is not None:
+            top4_rate, avg_low, avg_high, top4_low, top4_high = self.intervals[index.row()]
+            if index.column() == 2:
+                return tr("90% range: {0}-{1}").format(f"{avg_low:.2f}", f"{avg_high:.2f}")
+            if index.column() == 3:
+                return tr("Top 4 rate {0}, 90% range: {1}-{2}").format(f"{top4_rate:.0%}", f"{top4_low:.0%}",
+                                                                     f"{top4_high:.0%}")
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.headings[section]
+        return super().headerData(section, orientation, role)
+
+
 class MatchHistory(QWidget):
-    def __init__(self, parent, player_stats: stats.PlayerStats):
+    def __init__(self, parent, player_stats: stats.PlayerStats = None):
         super().__init__()
         self.parent = parent
         self.player_stats = player_stats
-        self.match_history_table = QTableWidget(stats.stats_per_page, 4)
-        self.page = 1
+        self.history_model = MatchHistoryModel(player_stats)
+        self.match_history_table = QTableView()
+        self.match_history_table.setModel(self.history_model)
         self.display_starting_hero = 0
         self.filter_ = settings.get(settings.filter_)
         if self.filter_ not in default_dates:
             self.filter_ = tr("All Matches")
             settings.set_(settings.filter_, self.filter_)
-        self.match_history_table.setHorizontalHeaderLabels([tr("Starting Hero"), tr("Ending Hero"), tr("Place"),
-                                                            tr("+/- MMR")])
         self.match_history_table.setColumnWidth(0, 140)
         self.match_history_table.setColumnWidth(1, 140)
         self.match_history_table.setColumnWidth(2, 80)
         self.match_history_table.setColumnWidth(3, 85)
         self.match_history_table.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        self.match_history_table.verticalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.match_history_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.match_history_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        #  no sort column means newest match first
+        self.match_history_table.horizontalHeader().setSortIndicator(-1, Qt.DescendingOrder)
+        self.match_history_table.setSortingEnabled(True)
 
         self.match_history_table.setContextMenuPolicy(Qt.CustomContextMenu)
 
         def history_menu(position):
+            index = self.match_history_table.indexAt(position)
+            if not index.isValid():
+                return
             menu = QMenu()
             delete_action = menu.addAction(tr("Delete"))
             action = menu.exec(self.match_history_table.mapToGlobal(position))
             if action == delete_action:
-                self.player_stats.delete_entry(self.match_history_table.itemAt(position).row() +
-                                               (self.page - 1) * stats.stats_per_page, reverse=True)
+                self.player_stats.delete_entry(self.history_model.position(index.row()))
                 self.update_history_table()
+                self.update_stats_table()
 
         self.match_history_table.customContextMenuRequested.connect(history_menu)
 
         paged_table = QWidget()
         paged_table.setMaximumWidth(533)
         paged_layout = QVBoxLayout(paged_table)
-
-        buttons_widget = QWidget()
-        page_buttons = QHBoxLayout(buttons_widget)
-        self.prev_button = QPushButton("<")
-        self.prev_button.clicked.connect(self.page_down)
-        self.prev_button.setMaximumWidth(50)
-        self.next_button = QPushButton(">")
-        self.next_button.setMaximumWidth(50)
-        self.next_button.clicked.connect(self.page_up)
-
-        self.page_indicator = QLabel("1")
-        self.page_indicator.setFont(QFont("Roboto", 16))
-
-        page_buttons.addWidget(self.prev_button, alignment=Qt.AlignRight)
-        page_buttons.addWidget(self.page_indicator, alignment=Qt.AlignCenter | Qt.AlignVCenter)
-        page_buttons.addWidget(self.next_button, alignment=Qt.AlignLeft)
-        page_buttons.setSpacing(0)
-
         paged_layout.addWidget(self.match_history_table)
-        paged_layout.addWidget(buttons_widget)
         paged_table.resize(200, paged_table.height())
 
         stats_widget = QWidget()
         stats_layout = QVBoxLayout(stats_widget)
-        self.stats_table = QTableWidget(asset_utils.get_num_heroes() + 1, 6)
-        self.stats_table.setHorizontalHeaderLabels([tr(heading) for heading in stats.headings])
+        self.stats_model = HeroStatsModel()
+        self.stats_table = QTableView()
+        self.stats_table.setModel(self.stats_model)
         self.stats_table.setColumnWidth(0, 130)
         self.stats_table.setColumnWidth(1, 115)
         self.stats_table.setColumnWidth(2, 115)
@@ -765,6 +977,11 @@ QTabBar::tab:right{
         self.filter_combo.activated.connect(self.filter_stats)
         self.sort_col = 0
         self.sort_asc = False
+        self.hero_tables = None
+        self.stats_generation = 0
+        self.stats_worker = StatsWorker()
+        self.stats_worker.tables_ready.connect(self.set_hero_tables)
+        self.stats_worker.start()
 
         filter_layout = QHBoxLayout(filter_widget)
         filter_layout.addWidget(self.toggle_hero)
@@ -783,33 +1000,35 @@ QTabBar::tab:right{
         self.update_history_table()
         self.update_stats_table()
 
-    def page_up(self):
-        if self.page < self.player_stats.get_num_pages():
-            self.page += 1
-        self.update_history_table()
-
-    def page_down(self):
-        if self.page > 1:
-            self.page -= 1
+    def set_player_stats(self, player_stats: stats.PlayerStats):
+        self.player_stats = player_stats
+        self.history_model.player_stats = player_stats
         self.update_history_table()
+        self.update_stats_table()
 
     def update_history_table(self):
-        history = self.player_stats.get_page(self.page)
-        update_table(self.match_history_table, history)
-        start_num = (self.page - 1) * stats.stats_per_page + 1
-        self.match_history_table.setVerticalHeaderLabels([str(i) for i in range(start_num,
-                                                                                start_num + stats.stats_per_page + 1)])
-        self.page_indicator.setText(f'Page {self.page} of {max(1, self.player_stats.get_num_pages())}')
+        self.history_model.refresh()
 
     def update_stats_table(self):
-        start, end = get_date_range(self.filter_)
-        hero_stats = self.player_stats.filter(start, end, self.sort_col, self.sort_asc)
-        chosen_stats = hero_stats[self.display_starting_hero]
-        update_table(self.stats_table, chosen_stats)
+        if self.player_stats is None:
+            return
+        date_range, build = get_stats_filter(self.filter_, self.player_stats)
+        self.stats_generation = self.stats_worker.request(self.player_stats, date_range, build)
+
+    def set_hero_tables(self, generation: int, hero_tables: list):
+        if generation == self.stats_generation:
+            self.hero_tables = hero_tables
+            self.show_hero_table()
+
+    def show_hero_table(self):
+        if self.hero_tables is not None:
+            table = self.hero_tables[self.display_starting_hero]
+            self.stats_model.set_rows(table.sorted(self.sort_col, self.sort_asc),
+                                      table.sorted_intervals(self.sort_col, self.sort_asc))
 
     def toggle_heroes(self, index: int):
         self.display_starting_hero = index
-        self.update_stats_table()
+        self.show_hero_table()
 
     def filter_stats(self):
         self.filter_ = self.filter_combo.currentText()
@@ -822,8 +1041,8 @@ QTabBar::tab:right{
         self.sort_col = index
         headings = stats.headings.copy()
         headings[index] = headings[index] + ("▼" if self.sort_asc else "▲")
-        self.stats_table.setHorizontalHeaderLabels(headings)
-        self.update_stats_table()
+        self.stats_model.set_headings(headings)
+        self.show_hero_table()
 
 
 class LiveGraphs(QWidget):
@@ -833,42 +1052,44 @@ class LiveGraphs(QWidget):
         self.user_palette = settings.get(settings.live_palette)
         self.states = None
 
-        self.health_canvas = FigureCanvasQTAgg(plt.Figure(figsize=(13.5, 18)))
-        self.xp_canvas = FigureCanvasQTAgg(plt.Figure(figsize=(13.5, 18)))
-        self.health_ax = self.health_canvas.figure.subplots()
-        self.xp_ax = self.xp_canvas.figure.subplots()
+        self.health_chart = ChartWidget()
+        self.health_chart.set_labels(xlabel="Turn", ylabel="Health")
+        self.xp_chart = ChartWidget()
+        self.xp_chart.set_labels(xlabel="Turn", ylabel="XP")
 
         graphs_tabs = QTabWidget(self)
-        graphs_tabs.addTab(self.health_canvas, tr("Health Graph"))
-        graphs_tabs.addTab(self.xp_canvas, tr("XP Graph"))
+        graphs_tabs.addTab(self.health_chart, tr("Health Graph"))
+        graphs_tabs.addTab(self.xp_chart, tr("XP Graph"))
+        graphs_tabs.currentChanged.connect(lambda _: self.update_graph())
         self.layout.addWidget(graphs_tabs)
 
     def set_color_palette(self, palette):
         self.user_palette = palette
         self.update_graph()
 
+    def showEvent(self, event):
+        super().showEvent(event)
+        #  the graphs aren't updated while they're hidden, so catch them up
+        self.update_graph()
+
     def update_graph(self, states: graphs.LivePlayerStates = None):
         if states:
             self.states = states
 
         if self.states:
-            self.xp_ax.cla()
-            graphs.xp_graph(self.states, self.xp_ax, self.user_palette)
-            self.xp_canvas.draw()
-
-            self.health_ax.cla()
-            graphs.live_health_graph(self.states, self.health_ax, self.user_palette)
-            self.health_canvas.draw()
+            if self.xp_chart.isVisible():
+                self.xp_chart.set_lines(graphs.live_lines(graphs.xp_series(self.states), self.user_palette))
+            if self.health_chart.isVisible():
+                self.health_chart.set_lines(graphs.live_lines(graphs.live_health_series(self.states),
+                                                              self.user_palette))
 
 
 class StatsGraph(QWidget):
-    def __init__(self, player_stats: stats.PlayerStats):
+    def __init__(self, player_stats: stats.PlayerStats = None):
         super().__init__()
         self.player_stats = player_stats
 
-        self.figure = None
-        self.canvas = FigureCanvasQTAgg(plt.Figure(figsize=(13.5, 18)))
-        self.ax = self.canvas.figure.subplots()
+        self.chart = ChartWidget()
 
         self.graph_selection = QComboBox()
         self.graph_selection.setMaximumWidth(200)
@@ -879,7 +1100,7 @@ class StatsGraph(QWidget):
 
         self.mmr_range = QComboBox()
         self.mmr_range.setMaximumWidth(200)
-        self.mmr_range.addItems(["25", "50", "100"])
+        self.mmr_range.addItems(["25", "50", "100", tr("All")])
         self.mmr_range.activated.connect(self.update_mmr_range)
         self.range_label = QLabel(tr("# Matches"))
 
@@ -891,21 +1112,40 @@ class StatsGraph(QWidget):
         combo_layout.addWidget(self.range_label, alignment=Qt.AlignRight)
         combo_layout.addWidget(self.mmr_range, alignment=Qt.AlignLeft)
         combo_layout.addStretch()
+        export_button = QPushButton(tr("Export Image"))
+        export_button.clicked.connect(self.export_image)
+        combo_layout.addWidget(export_button, alignment=Qt.AlignRight)
         self.layout.addLayout(combo_layout)
-        self.layout.addWidget(self.canvas)
+        self.layout.addWidget(self.chart)
+
+        self.update_graph()
 
+    def set_player_stats(self, player_stats: stats.PlayerStats):
+        self.player_stats = player_stats
         self.update_graph()
 
     def update_graph(self):
         self.selection = self.graph_selection.currentText()
-        self.ax.cla()
         self.mmr_range.setVisible(self.selection == graphs.mmr_change)
         self.range_label.setVisible(self.selection == graphs.mmr_change)
-        self.figure = graphs.stats_graph(self.player_stats.df, self.selection, self.ax, self.range)
-        self.canvas.draw()
+        if self.player_stats is None:
+            return
+        graphs.stats_chart(self.player_stats, self.selection, self.chart, self.range)
+
+    def export_image(self):
+        if self.player_stats is None:
+            return
+        filepath, _ = QFileDialog.getSaveFileName(self, tr("Export Image"), str(Path.home().joinpath("sbbtracker.png")),
+                                                  "PNG (*.png)")
+        if filepath:
+            try:
+                graphs.save_stats_graph(self.player_stats, self.selection, filepath, self.range)
+            except Exception:
+                logging.exception("Couldn't export the graph")
 
     def update_mmr_range(self):
-        self.range = int(self.mmr_range.currentText())
+        text = self.mmr_range.currentText()
+        self.range = int(text) if text.isdigit() else None
         self.update_graph()
 
 
@@ -923,8 +1163,9 @@ class HeroSelection(QWidget):
             hero_id = hero_ids[i]
             hero_name = asset_utils.get_card_name(hero_id)
             hero_names.append(hero_name)
-            placement, matches, histogram = player_stats.get_stats_for_hero(*get_date_range(latest_patch), hero_name)
-            self.heroes[i].update_hero(placement, matches, histogram, hero_id)
+            date_range, build = get_stats_filter(latest_patch, player_stats)
+            placement, matches, histogram, intervals = player_stats.get_stats_for_hero(*date_range, hero_name, build)
+            self.heroes[i].update_hero(placement, matches, histogram, hero_id, intervals)
             overlay.update_hero_rates(i, placement, matches)
         overlay.update_data_url(hero_names)
 
@@ -938,6 +1179,8 @@ class HeroStatsWidget(QWidget):
         self.placement.setFont(font)
         self.num_matches = QLabel("Matches: " + "0")
         self.num_matches.setFont(font)
+        self.intervals = QLabel()
+        self.intervals.setFont(QFont("Roboto", 12))
         self.hero_label = QLabel()
         self.hero_label.setFont(font)
         self.hero_name_label = QLabel()
@@ -950,31 +1193,30 @@ class HeroStatsWidget(QWidget):
         layout.addWidget(self.hero_label, alignment=Qt.AlignCenter)
         layout.addWidget(self.placement, alignment=Qt.AlignHCenter | Qt.AlignTop)
         layout.addWidget(self.num_matches, alignment=Qt.AlignCenter | Qt.AlignTop)
+        layout.addWidget(self.intervals, alignment=Qt.AlignCenter | Qt.AlignTop)
         layout.addWidget(self.histogram, alignment=Qt.AlignCenter | Qt.AlignTop)
         layout.addStretch()
 
-    def update_hero(self, placement, matches, histogram, hero_id):
+    def update_hero(self, placement, matches, histogram, hero_id, intervals=None):
         hero_name = asset_utils.get_card_name(hero_id)
         pixmap = QPixmap(asset_utils.get_card_path(hero_id, False))
         self.hero_label.setPixmap(pixmap)
         self.hero_name_label.setText(hero_name)
         self.placement.setText(tr("Avg Place") + ": " + str(placement))
         self.num_matches.setText(tr("# Matches") + ": " + str(matches))
+        if intervals and matches:
+            avg_low, avg_high, top4_low, top4_high = intervals
+            self.intervals.setText(tr("90% range: place {0}-{1}, top 4 {2}-{3}").format(
+                f"{avg_low:.2f}", f"{avg_high:.2f}", f"{top4_low:.0%}", f"{top4_high:.0%}"))
+        else:
+            self.intervals.setText("")
         self.histogram.draw_hist(histogram)
 
 
-class HistogramWidget(QWidget):
+class HistogramWidget(ChartWidget):
     def __init__(self, parent):
         super().__init__(parent)
-        self.figure = None
-        self.canvas = FigureCanvasQTAgg(plt.Figure(figsize=(13.5, 18)))
-        self.ax = self.canvas.figure.subplots()
-        layout = QVBoxLayout(self)
-        layout.addWidget(self.canvas)
+        self.set_labels(tr("Placements"))
 
     def draw_hist(self, series):
-        self.ax.cla()
-        self.ax.bar(np.arange(1,9), series[0], width=1)
-        self.ax.set_xticks(np.arange(1,9))
-        self.ax.set_title(tr("Placements"))
-        self.canvas.draw()
+        self.set_bars(np.arange(1, 9), series[0], graphs.chart_line_color)
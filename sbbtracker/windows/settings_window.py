@@ -1,10 +1,12 @@
+import logging
 import re
+from pathlib import Path
 
 import PySide6
 from PySide6.QtCore import QThread, Signal
 from PySide6.QtGui import QIcon, QIntValidator, Qt
-from PySide6.QtWidgets import QCheckBox, QComboBox, QFormLayout, QFrame, QHBoxLayout, QLabel, QLineEdit, QMainWindow, \
-    QMessageBox, QProgressDialog, QPushButton, QScrollArea, \
+from PySide6.QtWidgets import QCheckBox, QComboBox, QFileDialog, QFormLayout, QFrame, QHBoxLayout, QLabel, QLineEdit, \
+    QMainWindow, QMessageBox, QProgressDialog, QPushButton, QScrollArea, \
     QSlider, \
     QTabWidget, \
     QVBoxLayout, \
@@ -27,6 +29,24 @@ class ImportThread(QThread):
         self.player_stats.import_matches(self.update_progress.emit)
 
 
+class MergeThread(QThread):
+    update_progress = Signal(int, int)
+    merged = Signal(int)
+
+    def __init__(self, player_stats: stats.PlayerStats, filepath: Path):
+        super(MergeThread, self).__init__()
+        self.player_stats = player_stats
+        self.filepath = filepath
+
+    def run(self):
+        try:
+            num_added = self.player_stats.merge_csv(self.filepath, self.update_progress.emit)
+        except Exception:
+            logging.exception(f"Couldn't merge {self.filepath}")
+            num_added = -1
+        self.merged.emit(num_added)
+
+
 class NoScrollSlider(QSlider):
     def __init__(self, *args):
         super().__init__(*args)
@@ -102,6 +122,8 @@ class SettingSection(QFrame):
 
 
 class SettingsWindow(QMainWindow):
+    backed_up = Signal()
+
     def __init__(self, main_window):
         super().__init__()
         self.hide()
@@ -179,19 +201,28 @@ and Lunco
         data_layout = QFormLayout(data_tab)
         export_button = QPushButton(tr("Export Stats"))
         export_button.clicked.connect(main_window.export_csv)
+        merge_button = QPushButton(tr("Merge Stats File"))
+        merge_button.clicked.connect(self.merge_stats)
         delete_button = QPushButton(tr("Delete Stats"))
         delete_button.clicked.connect(lambda: main_window.delete_stats(self))
         self.last_backed_up = QLabel(tr("Last backup date") + f":{stats.most_recent_backup_date()}")
-        backup_button = QPushButton(tr("Backup Stats"))
-        backup_button.clicked.connect(self.backup)
+        self.backup_button = QPushButton(tr("Backup Stats"))
+        self.backup_button.clicked.connect(self.backup)
+        self.backed_up.connect(self.show_backups)
+        self.restore_date = QComboBox()
+        self.restore_date.addItems(stats.backup_dates()[::-1])
+        restore_button = QPushButton(tr("Restore Stats"))
+        restore_button.clicked.connect(self.restore)
         reimport_button = QPushButton(tr("Reimport Stats"))
         reimport_button.setDisabled(True)
         reimport_button.clicked.connect(self.import_stats)
 
         enable_upload = SettingsCheckbox(settings.upload_data)
 
-        data_layout.addRow(self.last_backed_up, backup_button)
+        data_layout.addRow(self.last_backed_up, self.backup_button)
+        data_layout.addRow(self.restore_date, restore_button)
         data_layout.addWidget(export_button)
+        data_layout.addWidget(merge_button)
         data_layout.addWidget(delete_button)
         data_layout.addWidget(QLabel(tr("Reimporting is temporarily disabled")))
         data_layout.addWidget(reimport_button)
@@ -209,15 +240,15 @@ and Lunco
         enable_overlay_checkbox.stateChanged.connect(lambda state: hide_overlay_in_bg_checkbox.setEnabled(bool(state)))
 
         show_tracker_button_checkbox = SettingsCheckbox(settings.show_tracker_button)
-        show_tracker_button_checkbox.setEnabled(enable_overlay_checkbox.checkState())
+        show_tracker_button_checkbox.setEnabled(enable_overlay_checkbox.isChecked())
         enable_overlay_checkbox.stateChanged.connect(lambda state: show_tracker_button_checkbox.setEnabled(bool(state)))
 
         show_hero_stats_checkbox = SettingsCheckbox(settings.enable_hero_stats)
-        show_hero_stats_checkbox.setEnabled(enable_overlay_checkbox.checkState())
+        show_hero_stats_checkbox.setEnabled(enable_overlay_checkbox.isChecked())
         enable_overlay_checkbox.stateChanged.connect(lambda state: show_hero_stats_checkbox.setEnabled(bool(state)))
 
         windows_scaling = SettingsCheckbox(settings.disable_scaling)
-        windows_scaling.setEnabled(enable_overlay_checkbox.checkState())
+        windows_scaling.setEnabled(enable_overlay_checkbox.isChecked())
         enable_overlay_checkbox.stateChanged.connect(lambda state: windows_scaling.setEnabled(bool(state)))
 
         general_overlay_section.addRow(tr("Enable overlay"), enable_overlay_checkbox)
@@ -229,7 +260,7 @@ and Lunco
         # Simulator
         simulator_section = SettingSection(tr("Simulator"))
         enable_sim_checkbox = SettingsCheckbox(settings.enable_sim)
-        enable_sim_checkbox.setEnabled(enable_overlay_checkbox.checkState())
+        enable_sim_checkbox.setEnabled(enable_overlay_checkbox.isChecked())
         enable_overlay_checkbox.stateChanged.connect(lambda state: enable_sim_checkbox.setEnabled(bool(state)))
 
         self.num_sims_silder = SliderCombo(100, 10000, settings.get(settings.number_simulations, 1000))
@@ -237,7 +268,7 @@ and Lunco
         self.simulator_transparency_slider = SliderCombo(0, 100, settings.get(settings.simulator_transparency))
         self.simulator_scale_slider = SliderCombo(80, 120, settings.get(settings.simulator_scale))
         enable_comps = SettingsCheckbox(settings.enable_comps)
-        enable_comps.setEnabled(enable_overlay_checkbox.checkState())
+        enable_comps.setEnabled(enable_overlay_checkbox.isChecked())
 
         simulator_section.addRow(tr("Enable simulator"), enable_sim_checkbox)
         simulator_section.addRow(tr("Number of simulations"), self.num_sims_silder)
@@ -258,7 +289,7 @@ and Lunco
         # Turn Display
         turn_section = SettingSection(tr("Turn Display"))
         enable_turn_display = SettingsCheckbox(settings.enable_turn_display)
-        enable_turn_display.setEnabled(enable_overlay_checkbox.checkState())
+        enable_turn_display.setEnabled(enable_overlay_checkbox.isChecked())
         enable_overlay_checkbox.stateChanged.connect(lambda state: enable_turn_display.setEnabled(bool(state)))
 
         turn_display_font = QLineEdit()
@@ -370,6 +401,8 @@ and Lunco
         self.main_window.export_comp_action.setVisible(settings.get(settings.export_comp_button))
 
     def import_stats(self):
+        if self.main_window.player_stats is None:
+            return
         message = tr("""
 Would you like to import your old games? This is done by 
 reading the record files generated by the game. This will 
@@ -400,8 +433,51 @@ The importer may take a long time to complete. Please be patient.
             self.main_window.match_history.update_history_table()
 
     def backup(self):
-        stats.backup_stats(force=True)
+        self.backup_button.setEnabled(False)
+        stats.start_backup(force=True, finished=self.backed_up.emit)
+
+    def show_backups(self):
+        self.backup_button.setEnabled(True)
         self.last_backed_up.setText(tr("Last backup date") + f": {stats.most_recent_backup_date()}")
+        self.restore_date.clear()
+        self.restore_date.addItems(stats.backup_dates()[::-1])
+
+    def restore(self):
+        day = self.restore_date.currentText()
+        if day and self.main_window.player_stats is not None:
+            reply = QMessageBox.question(self, tr("Restore Stats"),
+                                         tr("Replace your current stats with the backup from {0}?").format(day))
+            if reply == QMessageBox.Yes:
+                self.main_window.player_stats.restore(day)
+                self.main_window.match_history.update_history_table()
+                self.main_window.match_history.update_stats_table()
+
+    def merge_stats(self):
+        if self.main_window.player_stats is None:
+            return
+        filepath, filetype = QFileDialog.getOpenFileName(self, tr("Merge Stats File"), str(Path.home()),
+                                                         "Text CSV (*.csv)")
+        if filepath:
+            self.merge_thread = MergeThread(self.main_window.player_stats, Path(filepath))
+            self.merge_progress = QProgressDialog(tr("Merge progress"), "", 0, 100, self)
+            self.merge_progress.setWindowTitle(tr("Merge Stats File"))
+            #  a half merged file can't be backed out, so there's no cancelling
+            self.merge_progress.setCancelButton(None)
+            self.merge_thread.update_progress.connect(
+                lambda num, totalsize: self.merge_progress.setValue(int(num * 100 / totalsize)))
+            self.merge_thread.merged.connect(self.handle_merged)
+            self.merge_thread.start()
+            self.merge_progress.show()
+
+    def handle_merged(self, num_added):
+        self.merge_progress.close()
+        if num_added < 0:
+            QMessageBox.warning(self, tr("Merge Stats File"), tr("Couldn't read that stats file"))
+        else:
+            self.main_window.match_history.update_history_table()
+            self.main_window.match_history.update_stats_table()
+            self.main_window.stats_graph.update_graph()
+            QMessageBox.information(self, tr("Merge Stats File"), tr("Added {0} new matches").format(num_added))
 
     def handle_import_progress(self, num, totalsize):
         import_percent = num * 100 / totalsize
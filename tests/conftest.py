@@ -0,0 +1,35 @@
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+#  the stats folder is worked out when sbbtracker.paths is first imported, so point it at a scratch home before then
+home = Path(tempfile.mkdtemp(prefix="sbbtracker-tests-"))
+home.joinpath("Documents").mkdir()
+for variable in ["HOME", "USERPROFILE", "APPDATA"]:
+    os.environ[variable] = str(home)
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+
+@pytest.fixture
+def stats_folder():
+    """
+    An empty stats folder, cleared out again once the test is done
+    """
+    from sbbtracker import paths
+
+    def clear():
+        for path in sorted(paths.sbbtracker_folder.rglob("*"), reverse=True):
+            if path.is_file():
+                path.unlink()
+
+    clear()
+    yield paths.sbbtracker_folder
+    clear()
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(home, ignore_errors=True)
@@ -0,0 +1,123 @@
+from datetime import date
+
+import pandas as pd
+import pytest
+
+from sbbtracker import paths, stats
+
+
+def stats_csv(count: int, first=0):
+    return pd.DataFrame({
+        "StartingHero": ["Evella"] * count, "EndingHero": ["Pied Piper"] * count,
+        "Placement": [i % 8 + 1 for i in range(first, first + count)], "Timestamp": ["2022-03-01"] * count,
+        "+/-MMR": [10 - i % 20 for i in range(first, first + count)],
+        "SessionId": [f"session-{i}" for i in range(first, first + count)], "BuildId": [""] * count,
+    }).to_csv(index=False).encode("utf-8")
+
+
+@pytest.fixture
+def today(monkeypatch):
+    """
+    Set the day that backups are taken on
+    """
+    def set_today(day: str):
+        class Today(date):
+            @classmethod
+            def today(cls):
+                return cls.fromisoformat(day)
+
+        monkeypatch.setattr(stats, "date", Today)
+
+    return set_today
+
+
+def backup(today, day: str, data: bytes):
+    paths.statsfile.write_bytes(data)
+    today(day)
+    stats.backup_stats()
+
+
+def backup_bytes(day: str):
+    snapshot = [snapshot for snapshot in stats.load_backup_manifest() if snapshot["date"] <= day][-1]
+    return b"".join(stats.read_chunk(chunk) for chunk in snapshot["chunks"])
+
+
+def chunk_files():
+    return {chunk_file.stem for chunk_file in paths.backup_chunks_dir.glob("*.xz")}
+
+
+def test_restore_each_day(stats_folder, today):
+    days = {
+        "2022-03-01": stats_csv(10),
+        "2022-03-02": stats_csv(25),  # only grown, so just the new matches are stored
+        "2022-03-04": stats_csv(5, first=100),  # rewritten, so stored in full
+        "2022-03-05": stats_csv(30, first=100),
+    }
+    for day, data in days.items():
+        backup(today, day, data)
+
+    snapshots = {snapshot["date"]: snapshot for snapshot in stats.load_backup_manifest()}
+    assert list(snapshots) == list(days)
+    assert snapshots["2022-03-02"]["chunks"][:1] == snapshots["2022-03-01"]["chunks"]
+    assert len(snapshots["2022-03-02"]["chunks"]) == 2
+    assert len(snapshots["2022-03-04"]["chunks"]) == 1
+    for day, data in days.items():
+        assert backup_bytes(day) == data
+    #  a day without a backup restores the one before it
+    assert backup_bytes("2022-03-03") == days["2022-03-02"]
+    with pytest.raises(FileNotFoundError):
+        stats.read_backup("2022-02-28")
+
+    player_stats = stats.PlayerStats()
+    try:
+        for day, data in days.items():
+            player_stats.restore(day)
+            assert len(player_stats.df.index) == len(pd.read_csv(paths.statsfile))
+            assert sorted(player_stats.df['SessionId']) == sorted(pd.read_csv(stats.io.BytesIO(data))['SessionId'])
+    finally:
+        player_stats.close()
+
+
+def test_only_backup_taken_once_a_day(stats_folder, today):
+    backup(today, "2022-03-01", stats_csv(10))
+    backup(today, "2022-03-01", stats_csv(20))
+    assert backup_bytes("2022-03-01") == stats_csv(10)
+    stats.backup_stats(force=True)
+    assert backup_bytes("2022-03-01") == stats_csv(20)
+    assert stats.backup_dates() == ["2022-03-01"]
+
+
+def test_pruning_keeps_referenced_chunks(stats_folder, today):
+    backup(today, "2022-01-01", stats_csv(10))
+    backup(today, "2022-01-02", stats_csv(20))
+    first_chunks = chunk_files()
+    #  long enough later that both earlier snapshots are past the retention, but built on top of them
+    backup(today, "2022-08-01", stats_csv(30))
+
+    assert stats.backup_dates() == ["2022-08-01"]
+    assert first_chunks < chunk_files()
+    assert backup_bytes("2022-08-01") == stats_csv(30)
+
+    #  once nothing refers to the old chunks they're removed
+    backup(today, "2022-08-02", stats_csv(5, first=100))
+    backup(today, "2023-03-01", stats_csv(6, first=100))
+    referenced = {chunk for snapshot in stats.load_backup_manifest() for chunk in snapshot["chunks"]}
+    assert chunk_files() == referenced
+    assert not first_chunks & chunk_files()
+    for day in stats.backup_dates():
+        assert backup_bytes(day)
+
+
+def test_legacy_backups_folded_in(stats_folder, today):
+    legacy = {"2022-03-01": stats_csv(10), "2022-03-02": stats_csv(15)}
+    for day, data in legacy.items():
+        paths.backup_dir.joinpath(f"backup_{day}.csv").write_bytes(data)
+    backup(today, "2022-03-05", stats_csv(20))
+
+    assert stats.backup_dates() == ["2022-03-01", "2022-03-02", "2022-03-05"]
+    assert not list(paths.backup_dir.glob("backup_*.csv"))
+    for day, data in legacy.items():
+        assert backup_bytes(day) == data
+    assert backup_bytes("2022-03-05") == stats_csv(20)
+    #  the legacy backups grew one from the other, so they share chunks like any other backup
+    assert len(chunk_files()) == 3
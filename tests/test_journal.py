@@ -0,0 +1,114 @@
+from datetime import date
+
+import pandas as pd
+
+from sbbtracker import paths, stats
+
+
+def add_matches(player_stats: stats.PlayerStats, count: int, first=0):
+    for i in range(first, first + count):
+        player_stats.update_stats("Evella", "Pied Piper", str(i % 8 + 1), str(10 - i % 20), f"session-{i}",
+                                  timestamp=date(2022, 3, 1 + i % 28))
+
+
+def test_journal_replayed_after_crash(stats_folder):
+    player_stats = stats.PlayerStats()
+    add_matches(player_stats, 10)
+    #  closing without compacting leaves the matches only in the journal, as a crash would
+    player_stats.close()
+    assert not paths.statsfile.exists()
+    #  and a crash mid-append leaves a partly written record
+    with open(paths.journal_file, "a") as journal:
+        journal.write('{"StartingHero":"Evel')
+
+    player_stats = stats.PlayerStats()
+    try:
+        assert len(player_stats.df.index) == 10
+        assert set(player_stats.df['SessionId']) == {f"session-{i}" for i in range(10)}
+        #  the matches are counted once in the aggregates, even though they're also replayed from the journal
+        assert player_stats.aggregates.totals()['StartingHero']['Evella'][0] == 10
+    finally:
+        player_stats.close()
+
+
+def test_deletion_replayed_after_crash(stats_folder):
+    player_stats = stats.PlayerStats()
+    add_matches(player_stats, 10)
+    player_stats.delete_entry(3)
+    player_stats.close()
+
+    player_stats = stats.PlayerStats()
+    try:
+        assert len(player_stats.df.index) == 9
+        assert player_stats.aggregates.totals()['StartingHero']['Evella'][0] == 9
+    finally:
+        player_stats.close()
+
+
+def test_close_waits_for_compaction(stats_folder):
+    for run in range(5):
+        player_stats = stats.PlayerStats()
+        #  enough matches to start a compaction, and then close straight away
+        add_matches(player_stats, stats.compaction_threshold + 5, first=run * 100)
+        player_stats.start_compaction()
+        player_stats.close()
+
+        expected = (run + 1) * (stats.compaction_threshold + 5)
+        saved = pd.read_csv(paths.statsfile)
+        #  the stats file is either the last complete compaction or the one that was running, never half written
+        assert set(stats.stats_columns).issubset(saved.columns)
+        player_stats = stats.PlayerStats()
+        try:
+            assert len(player_stats.df.index) == expected
+        finally:
+            player_stats.close()
+
+
+def test_no_compaction_after_close(stats_folder):
+    player_stats = stats.PlayerStats()
+    add_matches(player_stats, 5)
+    player_stats.close()
+    player_stats.start_compaction()
+    player_stats.save()
+    assert not paths.statsfile.exists()
+
+
+def test_bad_record_skipped(stats_folder):
+    player_stats = stats.PlayerStats()
+    add_matches(player_stats, 3)
+    player_stats.close()
+    #  a complete record that can't be replayed, the matches either side of it still should be
+    with open(paths.journal_file, "a") as journal:
+        journal.write('{"StartingHero": "Evella"}\n')
+    player_stats = stats.PlayerStats()
+    add_matches(player_stats, 2, first=3)
+    player_stats.close()
+
+    player_stats = stats.PlayerStats()
+    try:
+        assert set(player_stats.df['SessionId']) == {f"session-{i}" for i in range(5)}
+    finally:
+        player_stats.close()
+
+
+def test_fallback_keeps_history(stats_folder):
+    player_stats = stats.PlayerStats()
+    add_matches(player_stats, 10)
+    player_stats.save()
+    player_stats.close()
+    saved = paths.statsfile.read_bytes()
+
+    #  stats opened without their history record new matches, but never overwrite the history with them
+    player_stats = stats.PlayerStats(load_history=False)
+    assert len(player_stats.df.index) == 0
+    add_matches(player_stats, 2, first=10)
+    player_stats.start_compaction()
+    player_stats.save()
+    player_stats.close()
+    assert paths.statsfile.read_bytes() == saved
+
+    player_stats = stats.PlayerStats()
+    try:
+        assert len(player_stats.df.index) == 12
+    finally:
+        player_stats.close()
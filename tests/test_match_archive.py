@@ -0,0 +1,116 @@
+import json
+
+from sbbtracker.match_archive import MatchArchive
+
+
+def match_data(session_id: str, rounds=3):
+    return {"session-id": session_id, "player-id": "me", "placement": 3,
+            "players": [{"player-id": "me", "heroes": ["SBB_HERO_EVELLA"], "healths": {"1": 40}}],
+            "combat-info": [{"round": round_number, "board": [f"card-{session_id}-{round_number}"]}
+                            for round_number in range(1, rounds + 1)]}
+
+
+def open_archive(tmp_path):
+    return MatchArchive(tmp_path.joinpath("matches.pack"), tmp_path.joinpath("matches.idx"))
+
+
+def test_round_trip(tmp_path):
+    archive = open_archive(tmp_path)
+    try:
+        archive.add("a", match_data("a"))
+        archive.add("b", match_data("b", rounds=0))
+        assert "a" in archive and "c" not in archive
+        assert archive.get_match("a") == match_data("a")
+        assert archive.get_match("b") == match_data("b", rounds=0)
+        assert "combat-info" not in archive.get_summary("a")
+        assert archive.get_combat("a", 2) == match_data("a")["combat-info"][1]
+        assert archive.get_combat("a", 7) is None
+
+        #  adding a session again replaces it
+        archive.add("a", match_data("a", rounds=1))
+        assert archive.get_match("a") == match_data("a", rounds=1)
+        assert len(archive) == 2
+    finally:
+        archive.close()
+
+
+def test_index_replayed(tmp_path):
+    archive = open_archive(tmp_path)
+    archive.add("a", match_data("a"))
+    with archive.batch():
+        for session_id in ["b", "c", "a"]:
+            archive.add(session_id, match_data(session_id, rounds=2))
+    archive.close()
+
+    archive = open_archive(tmp_path)
+    try:
+        assert sorted(archive.sessions()) == ["a", "b", "c"]
+        for session_id in ["a", "b", "c"]:
+            assert archive.get_match(session_id) == match_data(session_id, rounds=2)
+    finally:
+        archive.close()
+
+
+def test_torn_last_block(tmp_path):
+    archive = open_archive(tmp_path)
+    for session_id in ["a", "b", "c"]:
+        archive.add(session_id, match_data(session_id))
+    archive.close()
+    #  a crash partway through writing the last match's blocks
+    pack_path = tmp_path.joinpath("matches.pack")
+    pack_path.write_bytes(pack_path.read_bytes()[:-5])
+    with open(tmp_path.joinpath("matches.idx"), "a") as index:
+        index.write('{"session-id":"d","summ')
+
+    archive = open_archive(tmp_path)
+    try:
+        assert sorted(archive.sessions()) == ["a", "b"]
+        assert archive.get_match("b") == match_data("b")
+        archive.add("c", match_data("c"))
+        assert archive.get_match("c") == match_data("c")
+    finally:
+        archive.close()
+    archive = open_archive(tmp_path)
+    try:
+        assert sorted(archive.sessions()) == ["a", "b", "c"]
+        assert archive.get_combat("c", 3) == match_data("c")["combat-info"][2]
+    finally:
+        archive.close()
+
+
+def test_pack_synced_before_index(tmp_path):
+    archive = open_archive(tmp_path)
+    synced = []
+    pack_sync, index_sync = archive.sync, archive.index_journal.sync
+    archive.sync = lambda: (synced.append("pack"), pack_sync())
+    archive.index_journal.sync = lambda: (synced.append("index"), index_sync())
+    try:
+        archive.add("a", match_data("a"))
+        assert synced == ["pack", "index"]
+        synced.clear()
+        with archive.batch():
+            with archive.batch():
+                archive.add("b", match_data("b"))
+            archive.add("c", match_data("c"))
+            assert synced == []
+        assert synced == ["pack", "index"]
+    finally:
+        archive.close()
+
+
+def test_migrate(tmp_path):
+    json_dir = tmp_path.joinpath("matches")
+    json_dir.mkdir()
+    for session_id in ["a", "b"]:
+        json_dir.joinpath(f"{session_id}.json").write_text(json.dumps(match_data(session_id)))
+    json_dir.joinpath("broken.json").write_text("{")
+
+    archive = open_archive(tmp_path)
+    try:
+        archive.migrate(json_dir)
+        assert sorted(archive.sessions()) == ["a", "b"]
+        assert archive.get_match("a") == match_data("a")
+        #  files that couldn't be read are left where they are
+        assert [path.name for path in json_dir.iterdir()] == ["broken.json"]
+    finally:
+        archive.close()
@@ -0,0 +1,72 @@
+from datetime import date
+
+import pandas as pd
+
+from sbbtracker import stats
+
+#  the all matches range, and one from after the legacy matches
+all_time = ("1970-01-01", "2022-12-31")
+this_year = ("2022-01-01", "2022-12-31")
+
+
+def add_matches(player_stats: stats.PlayerStats, count: int):
+    for i in range(count):
+        player_stats.update_stats("Evella", "Evella", str(i % 8 + 1), "10", f"session-{i}",
+                                  timestamp=date(2022, 3, 1 + i))
+
+
+def test_merge_overlapping_csv(stats_folder, tmp_path, monkeypatch):
+    #  small chunks, so repeated matches turn up in different chunks of the file
+    monkeypatch.setattr(stats, "merge_chunk_size", 4)
+    player_stats = stats.PlayerStats()
+    try:
+        add_matches(player_stats, 10)
+        #  fill the caches the merge has to invalidate
+        player_stats.precompute_hero_stats([all_time, this_year])
+        assert int(player_stats.get_stats_for_hero(*all_time, "Evella")[1]) == 10
+        assert int(player_stats.get_stats_for_hero(*all_time, "Pied Piper")[1]) == 0
+
+        #  sessions 5-9 are already in the history and session 12 is in the file twice
+        exported = pd.DataFrame({
+            'StartingHero': "Pied Piper", 'EndingHero': "Pied Piper", 'Placement': [1, 2, 3, 4, 5, 6, 7, 8, 1, 2, 3],
+            'Timestamp': [f"2022-03-{day:02}" for day in range(6, 17)], '+/-MMR': 20, 'BuildId': "",
+            'SessionId': [*[f"session-{i}" for i in range(5, 15)], "session-12"],
+        })
+        typed_file = tmp_path.joinpath("exported.csv")
+        exported.to_csv(typed_file, index=False)
+        #  from before starting heroes, timestamps, MMR or session ids were recorded
+        legacy = pd.DataFrame({'Hero': ["Evella", "Evella", "Pied Piper"], 'Placement': [1, 1, 8]})
+        legacy_file = tmp_path.joinpath("legacy.csv")
+        legacy.to_csv(legacy_file, index=False)
+
+        assert player_stats.merge_csv(typed_file) == 5
+        assert player_stats.merge_csv(legacy_file) == 3
+        #  the legacy matches are identical to ones already merged, so they're only added once
+        assert player_stats.merge_csv(legacy_file) == 0
+        assert player_stats.merge_csv(typed_file) == 0
+
+        df = player_stats.df
+        assert len(df.index) == 18
+        assert df['SessionId'].str.strip().ne("").sum() == 15
+        #  the merged matches of the sessions already in the history didn't replace them
+        assert set(df[df['StartingHero'] == "Evella"]['SessionId']) == {f"session-{i}" for i in range(10)}
+
+        totals = player_stats.aggregates.totals()
+        assert totals['StartingHero']['Evella'][0] == 10
+        assert totals['StartingHero']['Pied Piper'][0] == 5
+        assert totals['EndingHero']['Evella'][0] == 12
+        assert totals['EndingHero']['Pied Piper'][0] == 6
+        assert int(player_stats.get_stats_for_hero(*all_time, "Pied Piper")[1]) == 5
+        assert int(player_stats.get_stats_for_hero(*this_year, "Evella")[1]) == 10
+        assert int(player_stats.query(this_year, None, "EndingHero", None, ["matches"])['matches'].iloc[0]) == 15
+        assert int(player_stats.query(all_time, None, "EndingHero", None, ["matches"])['matches'].iloc[0]) == 18
+    finally:
+        player_stats.close()
+
+    #  the merge went straight into the stats file
+    player_stats = stats.PlayerStats()
+    try:
+        assert len(player_stats.df.index) == 18
+        assert player_stats.aggregates.totals()['StartingHero']['Pied Piper'][0] == 5
+    finally:
+        player_stats.close()
@@ -0,0 +1,86 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+repo_root = Path(__file__).resolve().parents[1]
+
+#  only imported when they're first used, so none of them should be loaded before the splash screen shows
+deferred_modules = ["matplotlib", "sbbbattlesim", "construct", "requests", "numpy", "pandas"]
+
+#  everything application.py does before main() puts up the splash screen
+cold_start_script = """
+import json, sys, time
+began = time.perf_counter()
+import sbbtracker.application
+from sbbtracker.utils.startup_utils import import_budget
+print(json.dumps({"seconds": time.perf_counter() - began, "budget": import_budget, "modules": sorted(sys.modules)}))
+"""
+
+#  everything from launch until the main window is shown, stopping short of the event loop and answering any prompts
+main_window_script = """
+import json, os, sys, time
+began = time.perf_counter()
+from PySide6.QtWidgets import QApplication, QMessageBox
+QApplication.exec = lambda self: 0
+QMessageBox.question = staticmethod(lambda *args, **kwargs: QMessageBox.No)
+QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+from sbbtracker import application
+from sbbtracker.utils.startup_utils import startup_budget
+try:
+    application.main()
+except SystemExit:
+    pass
+print(json.dumps({"seconds": time.perf_counter() - began, "budget": startup_budget,
+                  "steps": [name for kind, name, seconds, modules in application.startup.steps]}), flush=True)
+#  the window's threads are still running, and the test only needs the timings
+os._exit(0)
+"""
+
+
+def run_app(script: str, home: Path):
+    """
+    Run the app in a fresh interpreter, with a fresh home folder so the stats folder gets set up from scratch
+    @return: what the script printed last
+    """
+    home.joinpath("Documents").mkdir()
+    env = {**os.environ, "HOME": str(home), "USERPROFILE": str(home), "APPDATA": str(home),
+           "PYTHONPATH": str(repo_root), "QT_QPA_PLATFORM": "offscreen"}
+    result = subprocess.run([sys.executable, "-c", script], env=env, cwd=home, capture_output=True, text=True,
+                            check=True, timeout=120)
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.fixture(scope="module")
+def cold_start(tmp_path_factory):
+    """
+    @return: the import time, the import budget and the modules loaded
+    """
+    return run_app(cold_start_script, tmp_path_factory.mktemp("home"))
+
+
+@pytest.fixture(scope="module")
+def main_window_start(tmp_path_factory):
+    """
+    @return: the time until the main window was shown, the startup budget and the steps the StartupReport recorded
+    """
+    pytest.importorskip("qt_material")
+    return run_app(main_window_script, tmp_path_factory.mktemp("home"))
+
+
+def test_imports_within_budget(cold_start):
+    assert cold_start["seconds"] < cold_start["budget"]
+
+
+@pytest.mark.parametrize("module", deferred_modules)
+def test_heavy_modules_deferred(cold_start, module):
+    assert module not in cold_start["modules"]
+
+
+def test_main_window_within_budget(main_window_start):
+    #  the report got as far as showing the main window, so the time covers the whole of startup
+    assert main_window_start["steps"][-1] == "Main window"
+    assert main_window_start["seconds"] < main_window_start["budget"]
@@ -0,0 +1,61 @@
+import time
+from datetime import date, timedelta
+
+from sbbtracker import stats
+
+#  importing 10k matches used to take minutes, when each one scanned and copied the whole history
+import_budget = 10
+heroes = ["Pied Piper", "Evella", "Apocalypse", "Celestial Tiger", "Merlin", "Mrs. Claus", "Fate", "Krampus"]
+
+
+def synthetic_matches(count: int):
+    first_day = date(2022, 1, 1)
+    for i in range(count):
+        yield heroes[i % len(heroes)], heroes[(i * 3) % len(heroes)], str(i % 8 + 1), str(40 - (i % 8) * 10), \
+            f"session-{i}", first_day + timedelta(days=i // 20)
+
+
+def test_import_10k_matches(stats_folder):
+    player_stats = stats.PlayerStats()
+    try:
+        began = time.perf_counter()
+        #  batched like import_matches, so the journal is only synced once
+        with player_stats.journal.batch():
+            for match in synthetic_matches(10000):
+                player_stats.update_stats(*match)
+        player_stats.flush()
+        elapsed = time.perf_counter() - began
+
+        assert len(player_stats.df.index) == 10000
+        assert elapsed < import_budget
+    finally:
+        player_stats.close()
+
+
+def test_duplicate_matches_skipped(stats_folder):
+    player_stats = stats.PlayerStats()
+    try:
+        for match in [*synthetic_matches(100), *synthetic_matches(50)]:
+            player_stats.update_stats(*match)
+        assert len(player_stats.df.index) == 100
+        assert player_stats.df['Timestamp'].is_monotonic_increasing
+    finally:
+        player_stats.close()
+
+
+def test_open_range_totals_kept_current(stats_folder):
+    player_stats = stats.PlayerStats()
+    try:
+        matches = list(synthetic_matches(100))
+        for match in matches[:90]:
+            player_stats.update_stats(*match)
+        #  the all matches table is over the open range, which is cached like any other range
+        player_stats.precompute_hero_stats([("1970-01-01", "2022-12-31")])
+        for match in matches[90:]:
+            player_stats.update_stats(*match)
+        tables = player_stats.hero_tables("1970-01-01", "2022-12-31")
+        assert tables[0].overall[1] == "100"
+        assert player_stats.range_totals_for(None, None) == {
+            role: dict(heroes) for role, heroes in player_stats.aggregates.totals().items()}
+    finally:
+        player_stats.close()